@@ -5,16 +5,31 @@ PromptGuard API — Cloud Deployment Ready (FINAL)
 ------------------------------------------------
 ✓ Auto-detects cloud → semantic_light + sanitizer_light
 ✓ Local PC → semantic_heavy + sanitizer_heavy
-✓ Analyzer always uses the correct engines (patched)
+✓ Analyzer always uses the correct engines (single registry)
+✓ Lazy model load + background warm-up → instant startup, /ready probe
 ✓ Fully Railway / Render compatible
 ✓ Dynamic PORT
+✓ Async Gemini upstream (pooled httpx client, timeouts)
+✓ /analyze/stream relays Gemini output as SSE
+✓ /metrics in Prometheus text format (per-stage histograms, verdicts, caches)
+✓ Production: python -m backend.server (pre-fork workers, shared model, /workers)
+✓ Hot-reloadable rule packs (RULE_PACK_FILE): /rulepack, /rulepack/reload
+✓ Multi-turn conversations: /conversation/turn analyzes only the new turn
+✓ Decisions stored in SQLite (WAL): paginated /history, /stats
 """
 
 import os
 import sys
-import requests
-from fastapi import FastAPI, HTTPException
+import json
+import asyncio
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -50,25 +65,23 @@ CLOUD = detect_cloud()
 
 
 # -------------------------------------------------------------
-# Import correct semantic + sanitizer based on environment
+# Select semantic + sanitizer engines ONCE (nothing loads yet)
 # -------------------------------------------------------------
+from backend.detectors import engines
+
+ENGINE = engines.select(os.getenv("PROMPTGUARD_ENGINE") or ("light" if CLOUD else "auto"))
 if CLOUD:
-    print("🌐 Cloud detected → Using semantic_light + sanitizer_light")
-    from backend.detectors.semantic_light import check_semantic
-    from backend.detectors.sanitizer_light import sanitize_prompt
+    print(f"🌐 Cloud detected → Using semantic_{ENGINE} + sanitizer_{ENGINE}")
 else:
-    print("💻 Local Mode → Using semantic_heavy + sanitizer_heavy")
-    from backend.detectors.semantic_heavy import check_semantic
-    from backend.detectors.sanitizer_heavy import sanitize_prompt
+    print(f"💻 Local Mode → Using semantic_{ENGINE} + sanitizer_{ENGINE}")
 
+from backend.detectors.analyzer import analyze_prompt, analyze_batch, VERDICT_CACHE
+from backend.detectors import metrics, sessions
+from backend.detectors.logger import LOG_WRITER
+from backend import policy, storage
 
-# -------------------------------------------------------------
-# Patch analyzer to use selected engines
-# -------------------------------------------------------------
-from backend.detectors import analyzer
-analyzer.check_semantic = check_semantic
-analyzer.sanitize_prompt = sanitize_prompt
-from backend.detectors.analyzer import analyze_prompt
+# Heavy model loads in the background after startup (PROMPTGUARD_WARMUP=0 → on first use)
+WARMUP_ON_START = os.getenv("PROMPTGUARD_WARMUP", "1") != "0"
 
 
 # -------------------------------------------------------------
@@ -80,6 +93,116 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     print("⚠ No GEMINI_API_KEY found — running in LOCAL MODE ONLY.\n")
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 256))
+
+# Required as X-Admin-Token on admin routes when set
+ADMIN_TOKEN = os.getenv("PROMPTGUARD_ADMIN_TOKEN")
+
+
+# -------------------------------------------------------------
+# Upstream client + analysis executor
+# -------------------------------------------------------------
+from backend import gemini_client
+
+# Rules/semantic are CPU-bound → run them off the event loop so it can keep
+# hundreds of Gemini calls in flight while a few threads do the analysis.
+ANALYSIS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSIS_WORKERS", 32)),
+    thread_name_prefix="analysis",
+)
+
+
+async def run_analysis(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(ANALYSIS_EXECUTOR, fn, *args)
+
+
+def analyze_with_timings(prompt: str, full_detail: bool = False, client_id: str = None):
+    """analyze_prompt() + the stage timings it recorded (collected in the worker thread)."""
+    with metrics.collect_timings() as timings:
+        analysis = analyze_prompt(prompt, full_detail, client_id=client_id)
+    return analysis, timings
+
+
+def _timings_block(timings: dict, start: float) -> dict:
+    block = {name: round(ms, 3) for name, ms in timings.items()}
+    block["total"] = round((time.perf_counter() - start) * 1000, 3)
+    return block
+
+
+# -------------------------------------------------------------
+# Scrape-time gauges (caches, queues)
+# -------------------------------------------------------------
+def _cache_stats() -> dict:
+    stats = {"verdict": VERDICT_CACHE.stats()}
+    engine = engines.semantic()
+    if hasattr(engine, "encoder_stats"):
+        stats["embedding"] = engine.encoder_stats()["cache"]
+    return stats
+
+
+metrics.gauge(
+    "promptguard_cache_hit_ratio", "Cache hit ratio since start.",
+    lambda: {(name,): s["hit_rate"] for name, s in _cache_stats().items()}, labels=("cache",),
+)
+metrics.gauge(
+    "promptguard_cache_hits_total", "Cache hits since start.",
+    lambda: {(name,): s["hits"] for name, s in _cache_stats().items()}, labels=("cache",), kind="counter",
+)
+metrics.gauge(
+    "promptguard_cache_misses_total", "Cache misses since start.",
+    lambda: {(name,): s["misses"] for name, s in _cache_stats().items()}, labels=("cache",), kind="counter",
+)
+metrics.gauge(
+    "promptguard_cache_entries", "Entries currently cached.",
+    lambda: {(name,): s["entries"] for name, s in _cache_stats().items()}, labels=("cache",),
+)
+metrics.gauge(
+    "promptguard_log_queue_depth", "Log events waiting for the writer thread.",
+    lambda: {(): LOG_WRITER.stats()["queue_depth"]},
+)
+metrics.gauge(
+    "promptguard_log_dropped_total", "Log events dropped because the queue was full.",
+    lambda: {(): LOG_WRITER.stats()["dropped"]}, kind="counter",
+)
+metrics.gauge(
+    "promptguard_storage_queue_depth", "Events waiting for the storage writer thread.",
+    lambda: {(): storage.STORE.stats()["queue_depth"]},
+)
+metrics.gauge(
+    "promptguard_storage_dropped_total", "Events not stored (queue full or write failed).",
+    lambda: {(): storage.STORE.stats()["dropped"] + storage.STORE.stats()["failed"]}, kind="counter",
+)
+metrics.gauge(
+    "promptguard_rule_pack_info", "Active rule pack (value is always 1).",
+    lambda: {(policy.active().version, policy.active().digest[:16]): 1}, labels=("version", "digest"),
+)
+metrics.gauge(
+    "promptguard_rule_pack_reloads_total", "Rule pack swaps since start.",
+    lambda: {(): policy.status()["reloads"]}, kind="counter",
+)
+metrics.gauge(
+    "promptguard_sessions_active", "Conversations with live session state in this process.",
+    lambda: {(): sessions.SESSIONS.stats()["sessions"]},
+)
+metrics.gauge(
+    "promptguard_engine_ready", "1 once the selected engines are loaded.",
+    lambda: {(engines.selected(),): int(engines.status()["ready"])}, labels=("engine",),
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP_ON_START:
+        engines.start_warm_up()
+    # Per process: under the pre-fork server every worker watches the file
+    policy.start_watcher()
+    yield
+    policy.stop_watcher()
+    storage.STORE.flush()
+    await gemini_client.close_client()
+    ANALYSIS_EXECUTOR.shutdown(wait=False)
+
 
 # -------------------------------------------------------------
 # FastAPI app
@@ -88,6 +211,7 @@ app = FastAPI(
     title="PromptGuard API",
     version="3.0.1",
     description="AI Prompt Firewall | Autoswitch semantic + sanitizer engines",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -106,6 +230,16 @@ class PromptRequest(BaseModel):
     prompt: str
 
 
+class BatchPromptRequest(BaseModel):
+    prompts: List[str]
+
+
+class TurnRequest(BaseModel):
+    conversation_id: str
+    turn: str
+    history: Optional[List[str]] = None
+
+
 # -------------------------------------------------------------
 # Routes
 # -------------------------------------------------------------
@@ -114,57 +248,309 @@ def health():
     return {"status": "OK", "mode": "cloud" if CLOUD else "local", "message": "PromptGuard API is running 🔥"}
 
 
+@app.get("/ready")
+def ready():
+    status = engines.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+@app.get("/workers")
+def workers_route():
+    """
+    Per-worker health behind the pre-fork server (python -m backend.server);
+    a single entry for this process otherwise.
+    """
+    from backend import server
+
+    workers = server.read_status()
+    if not workers:
+        return {"mode": "single", "served_by": os.getpid(),
+                "workers": [{"pid": os.getpid(), "healthy": True, "memory": server.memory_snapshot()}]}
+    return {
+        "mode": "prefork",
+        "served_by": os.getpid(),
+        "healthy": sum(1 for w in workers if w["healthy"]),
+        "workers": workers,
+    }
+
+
+def _check_admin(token):
+    if ADMIN_TOKEN and not hmac.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _require_admin(token):
+    """Routes that expose other users' data: closed until a token is configured."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Set PROMPTGUARD_ADMIN_TOKEN to enable this route")
+    _check_admin(token)
+
+
+def _client_id(value):
+    """X-Client-Id: an opaque per-browser id that scopes /history (None when absent)."""
+    if value is None:
+        return None
+    value = value.strip()
+    if not 8 <= len(value) <= 128:
+        raise HTTPException(status_code=422, detail="X-Client-Id must be 8-128 characters")
+    return value
+
+
+@app.get("/rulepack")
+def rulepack_route():
+    return {"served_by": os.getpid(), **policy.status()}
+
+
+@app.post("/rulepack/reload")
+def rulepack_reload_route(force: bool = False, x_admin_token: str = Header(None)):
+    """
+    Re-read RULE_PACK_FILE now, compile it and swap it in. A pack that
+    doesn't compile is rejected (422) and the current one stays active.
+    Under the pre-fork server this reloads the worker that serves the call;
+    the others pick up the file through their watchers.
+    """
+    _check_admin(x_admin_token)
+    if not policy.RULE_PACK_FILE:
+        raise HTTPException(status_code=409, detail="RULE_PACK_FILE is not set — running the built-in rules")
+    try:
+        result = policy.reload(force=force)
+    except policy.RulePackError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"served_by": os.getpid(), **result}
+
+
+@app.get("/encoder/stats")
+def encoder_stats_route():
+    engine = engines.semantic()
+    if not hasattr(engine, "encoder_stats"):
+        return {"enabled": False, "engine": engines.selected()}
+    return engine.encoder_stats()
+
+
+@app.get("/metrics")
+def metrics_route():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/analyze")
-def analyze_route(data: PromptRequest):
+async def analyze_route(data: PromptRequest, timings: bool = False, full_detail: bool = False,
+                        x_client_id: str = Header(None)):
+    """
+    ?timings=true adds a per-stage breakdown (ms) to the response.
+    ?full_detail=true runs every stage even when the verdict is already final.
+    X-Client-Id tags the stored decision for that client's /history.
+    """
+    start = time.perf_counter()
+    try:
+        return await _analyze_and_respond(data.prompt, timings, full_detail, start, _client_id(x_client_id))
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route="/analyze")
 
-    prompt = data.prompt
-    analysis = analyze_prompt(prompt)
+
+async def _analyze_and_respond(prompt: str, with_timings: bool, full_detail: bool, start: float, client_id: str = None):
+    analysis, stage_ms = await run_analysis(analyze_with_timings, prompt, full_detail, client_id)
+
+    def respond(body: dict) -> dict:
+        if with_timings:
+            body["timings"] = _timings_block(stage_ms, start)
+        return body
 
     # Unsafe → block early
     if not analysis["final_safe"]:
-        return {
+        return respond({
             "safe": False,
             "analysis": analysis,
             "response": "🚫 Unsafe prompt blocked by PromptGuard."
-        }
+        })
 
     # Safe but no Gemini key
     if not API_KEY:
-        return {
+        return respond({
             "safe": True,
             "analysis": analysis,
             "response": "⚠ Gemini not configured — only local analysis executed."
-        }
+        })
 
-    # Call Gemini API
+    # Call Gemini API (shared pooled async client)
     try:
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-        payload = { "contents": [ { "parts": [ { "text": prompt } ] } ] }
-        headers = { "Content-Type": "application/json" }
-
-        res = requests.post(f"{url}?key={API_KEY}", json=payload, headers=headers)
+        upstream_start = time.perf_counter()
+        try:
+            res = await gemini_client.generate_content(prompt, API_KEY)
+        finally:
+            upstream = time.perf_counter() - upstream_start
+            metrics.STAGE_SECONDS.observe(upstream, stage="upstream")
+            stage_ms["upstream"] = upstream * 1000
 
         if res.status_code != 200:
             raise HTTPException(status_code=res.status_code, detail=res.text)
 
-        g = res.json()
-        text = (
-            g.get("candidates", [{}])[0]
-             .get("content", {})
-             .get("parts", [{}])[0]
-             .get("text", "⚠ Gemini returned no text.")
-        )
+        text = gemini_client.extract_text(res.json())
 
-        return {
+        return respond({
             "safe": True,
             "analysis": analysis,
             "response": text
-        }
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini API error: {e}")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_stream_route(data: PromptRequest, full_detail: bool = False, x_client_id: str = Header(None)):
+    """
+    Same input analysis as /analyze, then Gemini's answer relayed as it
+    arrives. Server-Sent Events, in order:
+        analysis → chunk* (or response) → error? → done
+    """
+    prompt = data.prompt
+    start = time.perf_counter()
+    analysis = await run_analysis(analyze_prompt, prompt, full_detail, True, _client_id(x_client_id))
+
+    async def events():
+        yield _sse("analysis", {"safe": analysis["final_safe"], "analysis": analysis})
+
+        # Unsafe → block early
+        if not analysis["final_safe"]:
+            yield _sse("response", {"text": "🚫 Unsafe prompt blocked by PromptGuard."})
+
+        # Safe but no Gemini key
+        elif not API_KEY:
+            yield _sse("response", {"text": "⚠ Gemini not configured — only local analysis executed."})
+
+        else:
+            upstream_start = time.perf_counter()
+            try:
+                async for chunk in gemini_client.stream_generate_content(prompt, API_KEY):
+                    yield _sse("chunk", {"text": chunk})
+            except Exception as e:
+                yield _sse("error", {"detail": f"Gemini API error: {e}"})
+            finally:
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - upstream_start, stage="upstream_stream")
+
+        yield _sse("done", {})
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route="/analyze/stream")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze/batch")
+def analyze_batch_route(data: BatchPromptRequest, full_detail: bool = False, x_client_id: str = Header(None)):
+    """
+    Input analysis only (no Gemini call) for many prompts at once —
+    the semantic stage encodes the whole batch in one pass.
+    """
+    if len(data.prompts) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(data.prompts)} prompts (max {MAX_BATCH_SIZE})",
+        )
+
+    start = time.perf_counter()
+    results = analyze_batch(data.prompts, full_detail, client_id=_client_id(x_client_id))
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route="/analyze/batch")
+
+    return {
+        "count": len(results),
+        "blocked": sum(1 for r in results if not r["final_safe"]),
+        "results": [{"safe": r["final_safe"], "analysis": r} for r in results],
+    }
+
+
+@app.get("/history")
+def history_route(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    verdict: Optional[str] = None,
+    category: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    x_admin_token: str = Header(None),
+    x_client_id: str = Header(None),
+):
+    """
+    Stored decisions, newest first. With X-Client-Id: that client's own
+    decisions (the frontend History panel); with the admin token: everyone's.
+    Pass next_cursor back as ?cursor= for the next page. verdict=blocked|safe,
+    category=JAILBREAK, since/until are unix timestamps.
+    """
+    client = _client_id(x_client_id)
+    if x_admin_token is not None or client is None:
+        _require_admin(x_admin_token)
+        client = None
+    if not storage.STORAGE_ENABLED:
+        raise HTTPException(status_code=409, detail="Event storage is disabled (PROMPTGUARD_STORAGE=0)")
+    try:
+        return storage.STORE.history(limit, cursor, verdict, category, since, until, client)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/stats")
+def stats_route(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    bucket: str = "hour",
+    x_admin_token: str = Header(None),
+):
+    """Totals, blocks per category and a timeline (default: the last 24 h, hourly). Admin token required."""
+    _require_admin(x_admin_token)
+    if not storage.STORAGE_ENABLED:
+        raise HTTPException(status_code=409, detail="Event storage is disabled (PROMPTGUARD_STORAGE=0)")
+    try:
+        return {**storage.STORE.summary(since, until, bucket), "writer": storage.STORE.stats()}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/conversation/turn")
+async def conversation_turn_route(data: TurnRequest, full_detail: bool = False):
+    """
+    Input analysis only (no Gemini call) for the newest turn of a
+    conversation. Earlier turns are remembered per conversation_id, so each
+    call costs one turn — and jailbreaks split across turns are caught.
+    """
+    cid = data.conversation_id.strip()
+    if not cid or len(cid) > 128:
+        raise HTTPException(status_code=422, detail="conversation_id must be 1-128 characters")
+
+    start = time.perf_counter()
+    result = await run_analysis(sessions.analyze_turn, cid, data.turn, data.history, full_detail)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route="/conversation/turn")
+
+    return {"safe": result["final_safe"], "session": result["session"], "analysis": result}
+
+
+@app.delete("/conversation/{conversation_id}")
+def conversation_end_route(
+    conversation_id: str,
+    x_conversation_token: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Drops the conversation's state. Needs the conversation_token returned by
+    the turn that opened it (X-Conversation-Token) or the admin token.
+    """
+    if x_conversation_token is None or not sessions.check_token(conversation_id, x_conversation_token):
+        _require_admin(x_admin_token)
+    return {"conversation_id": conversation_id, "ended": sessions.end_session(conversation_id)}
+
+
+@app.get("/conversation/stats")
+def conversation_stats_route():
+    return {"served_by": os.getpid(), **sessions.SESSIONS.stats()}
+
+
 # -------------------------------------------------------------
 # Local runner
 # -------------------------------------------------------------
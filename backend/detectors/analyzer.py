@@ -1,24 +1,34 @@
 print("🔥 ANALYZER FINGERPRINT: VERSION S — SEMANTIC-UPGRADED")
 
+import os
 from copy import deepcopy
+from backend import policy, storage
+from backend.detectors.normalize import NormalizedPrompt
 from backend.detectors.rules import check_rules
 
 # -----------------------------------------------------
-# 🔥 AUTO-DETECT SEMANTIC ENGINE (heavy → light fallback)
+# 🔥 ENGINES (heavy/light) — chosen once by the registry
 # -----------------------------------------------------
-try:
-    from backend.detectors.semantic_heavy import check_semantic
-    print("🔍 Semantic Engine: HEAVY (MPNet) — Local Mode")
-except Exception:
-    from backend.detectors.semantic_light import check_semantic
-    print("🔍 Semantic Engine: LIGHT (Keyword + Heuristics) — Cloud Mode")
+# Nothing is loaded here: the registry resolves the selected module on
+# first call, and the heavy model loads lazily / in the API warm-up.
+from backend.detectors import engines
+
+
+def check_semantic(prompt) -> dict:
+    return engines.semantic().check_semantic(prompt)
+
+
+def check_semantic_batch(prompts: list) -> list:
+    return engines.semantic().check_semantic_batch(prompts)
+
+
+def sanitize_prompt(prompt) -> str:
+    return engines.sanitizer().sanitize_prompt(prompt)
 
-# -----------------------------------------------------
-# 🔥 AUTO-DETECT SANITIZER (heavy → light fallback)
-# -----------------------------------------------------
-from backend.detectors.sanitizer import sanitize_prompt
 
+from backend.detectors import metrics
 from backend.detectors.logger import log_event
+from backend.detectors.verdict_cache import VerdictCache, fingerprint
 
 """
 FINAL ANALYZER — VERSION S
@@ -28,6 +38,12 @@ FINAL ANALYZER — VERSION S
 ✓ Heavy sanitizer locally
 ✓ Light sanitizer in cloud
 ✓ No sklearn/sentence-transformers in railway
+✓ Per-stage timers (rules / semantic / sanitizer / log) → /metrics
+✓ Fast verdict: stages run cheapest-first and stop once the verdict is final
+✓ Hot-reloadable rule packs: each request pins one pack (backend/policy.py)
+  for every stage; results report its version under "rule_pack"
+✓ One NormalizedPrompt per request (NFKC, casefold, homoglyphs, offsets)
+  shared by rules, semantic and sanitizer
 """
 
 SEMANTIC_THRESHOLD = 0.78
@@ -36,6 +52,57 @@ SECOND_CHANCE_THRESHOLD = 0.45
 
 PROTECTED_CATEGORIES = {"ILLEGAL", "JAILBREAK", "SELF_HARM", "HATE_SPEECH"}
 
+# Fast verdict (default): a rule block in a PROTECTED category is final —
+# second-chance can't apply, so the semantic score could only change the
+# reason text. Those prompts never touch the model; the result lists the
+# stage under "skipped_stages". ANALYZER_FAST_VERDICT=0 (or full_detail=True
+# per call) always runs every stage.
+FAST_VERDICT = os.getenv("ANALYZER_FAST_VERDICT", "1") != "0"
+
+# Stand-in semantic result for a skipped semantic stage
+_SEMANTIC_SKIPPED = {"safe": True, "score": 0.0, "matched_prompt": None}
+
+# -----------------------------------------------------
+# Verdict cache (prompt + config fingerprint → result)
+# -----------------------------------------------------
+VERDICT_CACHE = VerdictCache(
+    ttl_seconds=float(os.getenv("VERDICT_CACHE_TTL", 300)),
+    max_entries=int(os.getenv("VERDICT_CACHE_SIZE", 10000)),
+)
+
+_fingerprint_memo = (None, None)
+
+
+def config_fingerprint(pack=None) -> str:
+    """
+    Hash of everything that can change a verdict: rule pack, thresholds and
+    the semantic/sanitizer engines. Resolved at call time (engine selection,
+    model fallback and pack swaps happen after import) and memoized.
+    """
+    global _fingerprint_memo
+
+    pack = pack or policy.current()
+    engine = engines.semantic()
+    ident = (
+        pack, engines.selected(), check_semantic, sanitize_prompt,
+        getattr(engine, "MODEL_NAME", None),
+        SEMANTIC_THRESHOLD, KEYWORD_SEMANTIC_FORCE_BLOCK, SECOND_CHANCE_THRESHOLD,
+        frozenset(PROTECTED_CATEGORIES),
+    )
+    if _fingerprint_memo[0] == ident:
+        return _fingerprint_memo[1]
+
+    fp = fingerprint(
+        pack.digest,
+        engine.__name__,
+        getattr(engine, "MODEL_NAME", None),
+        engines.sanitizer().__name__,
+        SEMANTIC_THRESHOLD, KEYWORD_SEMANTIC_FORCE_BLOCK, SECOND_CHANCE_THRESHOLD,
+        sorted(PROTECTED_CATEGORIES),
+    )
+    _fingerprint_memo = (ident, fp)
+    return fp
+
 
 def _normalize_rule_result(rule_result):
     if isinstance(rule_result, dict):
@@ -57,40 +124,51 @@ def _normalize_rule_result(rule_result):
     return {"safe": True, "matched_pattern": None, "category": None, "message": "Unknown rule result"}
 
 
-def analyze_prompt(prompt: str) -> dict:
-    prompt_cleaned = (prompt or "").strip()
-
-    if not prompt_cleaned:
+def _rule_stage(prompt: NormalizedPrompt, fast: bool = False):
+    """
+    Rules + the early exits that don't need the semantic engine.
+    Returns (norm_rule, result) — result is set when the verdict is already final.
+    """
+    if not prompt.original:
         result = {
             "final_safe": True,
             "reason": ["Empty prompt"],
             "sanitized": "",
             "semantic_score": 0.0,
-            "rule_details": {"safe": True}
+            "rule_details": {"safe": True},
+            "skipped_stages": ["rules", "semantic"],
         }
-        log_event(result)
-        return result
+        return None, result
 
-    raw_rule = check_rules(prompt_cleaned)
+    with metrics.stage("rules"):
+        raw_rule = check_rules(prompt)
     norm_rule = _normalize_rule_result(raw_rule)
-    rule_effective = deepcopy(norm_rule)
 
     # Educational override
     if (norm_rule.get("message") or "").startswith("Educational context"):
         result = {
             "final_safe": True,
             "reason": ["Educational context detected"],
-            "sanitized": prompt_cleaned,
+            "sanitized": prompt.original,
             "semantic_score": 0.0,
-            "rule_details": rule_effective,
+            "rule_details": deepcopy(norm_rule),
+            "skipped_stages": ["semantic"],
         }
-        log_event(result)
-        return result
+        return norm_rule, result
+
+    # Fast verdict: protected-category block → semantic can't change it
+    category = (norm_rule.get("category") or "").upper()
+    if fast and not norm_rule.get("safe", True) and category in PROTECTED_CATEGORIES:
+        result = _decide(prompt, norm_rule, _SEMANTIC_SKIPPED)
+        result["skipped_stages"] = ["semantic"]
+        return norm_rule, result
+
+    return norm_rule, None
+
+
+def _decide(prompt: NormalizedPrompt, norm_rule: dict, sem: dict) -> dict:
+    rule_effective = deepcopy(norm_rule)
 
-    # ----------------------------
-    # SEMANTIC ENGINE (heavy/light)
-    # ----------------------------
-    sem = check_semantic(prompt_cleaned)
     semantic_score = float(sem.get("score", 0.0))
     semantic_safe_flag = bool(sem.get("safe", True))
     semantic_matched = sem.get("matched_prompt")
@@ -107,6 +185,7 @@ def analyze_prompt(prompt: str) -> dict:
     # Second-chance override (non-protected)
     # ---------------------------------------
     original_category = (norm_rule.get("category") or "").upper()
+    protected_block = not norm_rule.get("safe", True) and original_category in PROTECTED_CATEGORIES
 
     if (not norm_rule.get("safe", True)) and (semantic_score < SECOND_CHANCE_THRESHOLD):
         if original_category not in PROTECTED_CATEGORIES:
@@ -133,7 +212,11 @@ def analyze_prompt(prompt: str) -> dict:
     if not reasons:
         reasons = ["No violations"]
 
-    sanitized = prompt_cleaned if final_safe else sanitize_prompt(prompt_cleaned)
+    if final_safe:
+        sanitized = prompt.original
+    else:
+        with metrics.stage("sanitizer"):
+            sanitized = sanitize_prompt(prompt)
 
     result = {
         "final_safe": final_safe,
@@ -142,12 +225,131 @@ def analyze_prompt(prompt: str) -> dict:
         "semantic_score": semantic_score,
         "rule_details": rule_effective,
         "semantic_matched": semantic_matched,
-        "severity": SEVERITY
+        # A protected-category rule block is final whatever the score → HIGH,
+        # also when the fast verdict skipped the semantic stage. The reason
+        # text above keeps the score's own grade.
+        "severity": "HIGH" if protected_block else SEVERITY,
+        "skipped_stages": [],
     }
 
+    # Long prompts (heavy engine): which window produced the score
+    if sem.get("window"):
+        result["semantic_window"] = sem["window"]
+    return result
+
+
+def result_category(result: dict):
+    """Category of a block: the rule's, else SEMANTIC. None for safe results."""
+    if result.get("final_safe", True):
+        return None
+    rule = result.get("rule_details") or {}
+    if not rule.get("safe", True) and rule.get("category"):
+        return rule["category"]
+    return "SEMANTIC"
+
+
+def log_result(result: dict, prompt: str = None, source: str = "analyze", **extra):
+    """Audit log + event storage. extra: conversation_id, client_id, category override."""
+    metrics.record_verdict(result)
+    event = {
+        **result,
+        "prompt": prompt,
+        "rule_category": (result.get("rule_details") or {}).get("category"),
+        "category": result_category(result),
+        "source": source,
+        **extra,
+    }
     try:
-        log_event(result)
+        with metrics.stage("log"):
+            log_event(event)
+            storage.record_event(event)
     except Exception:
         pass
 
+
+def _normalize(prompt_cleaned: str) -> NormalizedPrompt:
+    with metrics.stage("normalize"):
+        return NormalizedPrompt(prompt_cleaned)
+
+
+def _analyze(prompt_cleaned: str, fast: bool) -> dict:
+    prompt = _normalize(prompt_cleaned)
+    norm_rule, result = _rule_stage(prompt, fast)
+    if result is not None:
+        return result
+
+    # ----------------------------
+    # SEMANTIC ENGINE (heavy/light)
+    # ----------------------------
+    with metrics.stage("semantic"):
+        sem = check_semantic(prompt)
+
+    return _decide(prompt, norm_rule, sem)
+
+
+def _cache_fingerprint(fast: bool, pack) -> str:
+    # Fast and full-detail results differ in detail → separate cache entries
+    return config_fingerprint(pack) + (":fast" if fast else ":full")
+
+
+def _stamp(result: dict, pack) -> dict:
+    result["rule_pack"] = pack.version
     return result
+
+
+def analyze_prompt(prompt: str, full_detail: bool = False, log: bool = True, client_id: str = None) -> dict:
+    """
+    log=False → the caller logs the (possibly amended) result itself.
+    client_id tags the stored event (per-client /history).
+    """
+    prompt_cleaned = (prompt or "").strip()
+    fast = FAST_VERDICT and not full_detail
+
+    # One pack for the whole request — a swap mid-request doesn't mix versions
+    with policy.pinned() as pack:
+        # Identical prompts in flight at the same time are computed once
+        key = VERDICT_CACHE.make_key(_cache_fingerprint(fast, pack), prompt_cleaned)
+        result = VERDICT_CACHE.get_or_compute(key, lambda: _stamp(_analyze(prompt_cleaned, fast), pack))
+
+    # Every request is still logged — the log is the audit trail
+    if log:
+        log_result(result, prompt_cleaned, client_id=client_id)
+    return deepcopy(result)
+
+
+def analyze_batch(prompts: list, full_detail: bool = False, log: bool = True, client_id: str = None) -> list:
+    """
+    analyze_prompt() for many prompts at once.
+    Rules run per item; every prompt that reaches the semantic stage is
+    scored in ONE check_semantic_batch() call (single encode on heavy).
+    log=False → offline re-scans stay out of the audit log.
+    """
+    cleaned = [(p or "").strip() for p in prompts]
+    fast = FAST_VERDICT and not full_detail
+
+    with policy.pinned() as pack:
+        fp = _cache_fingerprint(fast, pack)
+        keys = [VERDICT_CACHE.make_key(fp, c) for c in cleaned]
+
+        results = [VERDICT_CACHE.get(k) for k in keys]
+        misses = [i for i, r in enumerate(results) if r is None]
+
+        norms = {i: _normalize(cleaned[i]) for i in misses}
+        staged = {i: _rule_stage(norms[i], fast) for i in misses}
+        pending = [i for i in misses if staged[i][1] is None]
+        sems = []
+        if pending:
+            with metrics.stage("semantic"):
+                sems = check_semantic_batch([norms[i] for i in pending])
+
+        for i in misses:
+            results[i] = staged[i][1]
+        for i, sem in zip(pending, sems):
+            results[i] = _decide(norms[i], staged[i][0], sem)
+        for i in misses:
+            VERDICT_CACHE.put(keys[i], _stamp(results[i], pack))
+
+    if log:
+        for prompt, result in zip(cleaned, results):
+            log_result(result, prompt, source="batch", client_id=client_id)
+    return [deepcopy(r) for r in results]
@@ -0,0 +1,117 @@
+# backend/detectors/batcher.py
+
+"""
+Dynamic Micro-Batcher
+---------------------
+✓ Collects concurrent single-prompt encode calls from worker threads
+✓ Flushes after a short window (ms) or once max batch size is reached
+✓ One model forward pass per batch instead of one per request
+✓ Each caller gets back exactly its own row
+✓ Queue depth / batch size stats for monitoring
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Wraps a batch function  encode_fn(list[str]) -> sequence of rows
+    and exposes a blocking single-item encode(text) that many threads can
+    call at once. A background thread groups pending calls into batches.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._max_seen = 0
+
+    # ----------------------------------------------------
+    # Worker lifecycle (lazy, and restarted after fork)
+    # ----------------------------------------------------
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name="encoder-microbatch", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        q = self._queue
+        while True:
+            batch = self._collect(q.get())
+            texts = [text for text, _ in batch]
+
+            try:
+                rows = self.encode_fn(texts)
+                for (_, fut), row in zip(batch, rows):
+                    fut.set_result(row)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
+                self._max_seen = max(self._max_seen, len(batch))
+
+    # ----------------------------------------------------
+    # Public API
+    # ----------------------------------------------------
+    def submit(self, text: str) -> Future:
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def encode(self, text: str, timeout: float = None):
+        """Blocking single-text encode; returns that text's row."""
+        return self.submit(text).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_seen,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
@@ -0,0 +1,104 @@
+# backend/detectors/embedding_cache.py
+
+"""
+Embedding Cache
+---------------
+✓ Bounded in-process LRU of prompt embeddings
+✓ Keyed on hash(model name + normalized prompt)
+✓ Memory cap in MB (vector bytes + per-entry overhead)
+✓ Hit / miss / eviction counters
+✓ Thread-safe (API worker threads share one cache)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Rough bookkeeping cost per entry: 20-byte digest key, OrderedDict node, ndarray header
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.digest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, model_name: str, max_mb: float = 64.0):
+        self.model_name = model_name
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _size(self, vec) -> int:
+        return int(getattr(vec, "nbytes", 0)) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, text: str):
+        if not self.enabled:
+            return None
+        key = cache_key(self.model_name, text)
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, text: str, vec):
+        if not self.enabled:
+            return
+        size = self._size(vec)
+        if size > self.max_bytes:
+            return
+
+        key = cache_key(self.model_name, text)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+
+            self._data[key] = vec
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "memory_mb": round(self._bytes / (1024 * 1024), 3),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
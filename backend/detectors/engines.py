@@ -0,0 +1,147 @@
+# backend/detectors/engines.py
+
+"""
+Engine Registry
+---------------
+✓ ONE place that decides heavy vs light semantic + sanitizer engines
+✓ Selection never loads a model (heavy is detected via find_spec only)
+✓ Heavy model loads lazily, or in a background warm-up
+✓ Readiness status for the /ready endpoint
+✓ Heavy model fails to load → remembered once, light serves from then on
+"""
+
+import importlib
+import importlib.util
+import os
+import threading
+import time
+
+ENGINES = {
+    "heavy": {
+        "semantic": "backend.detectors.semantic_heavy",
+        "sanitizer": "backend.detectors.sanitizer_heavy",
+    },
+    "light": {
+        "semantic": "backend.detectors.semantic_light",
+        "sanitizer": "backend.detectors.sanitizer_light",
+    },
+}
+
+HEAVY_REQUIREMENTS = ("sentence_transformers", "numpy")
+
+_selected = None
+_lock = threading.Lock()
+
+_status = {
+    "ready": False,
+    "warming_up": False,
+    "warmup_seconds": None,
+    "error": None,
+    "fallback": None,
+}
+
+
+def heavy_available() -> bool:
+    return all(importlib.util.find_spec(name) is not None for name in HEAVY_REQUIREMENTS)
+
+
+def select(mode: str = None) -> str:
+    """
+    Pick the engine pair once per process.
+      mode / PROMPTGUARD_ENGINE: "heavy" | "light" | "auto" (default)
+    "auto" uses heavy when its packages are installed, else light.
+    """
+    global _selected
+
+    with _lock:
+        mode = (mode or os.getenv("PROMPTGUARD_ENGINE") or "auto").lower()
+        if mode == "auto":
+            mode = "heavy" if heavy_available() else "light"
+        if mode not in ENGINES:
+            raise ValueError(f"Unknown engine '{mode}' (expected one of {sorted(ENGINES)})")
+
+        if mode != _selected:
+            _selected = mode
+            _status.update(ready=False, warmup_seconds=None, error=None)
+            print(f"🔍 Engine registry → {mode.upper()} semantic + sanitizer")
+        return _selected
+
+
+def selected() -> str:
+    return _selected or select()
+
+
+def fall_back(error: str) -> str:
+    """
+    The heavy model can't be loaded: remember why and serve the light
+    engine for the rest of this process — never retried per request.
+    """
+    global _selected
+
+    with _lock:
+        if _selected == "heavy":
+            _selected = "light"
+            _status.update(ready=False, warmup_seconds=None, error=None, fallback=f"heavy: {error}")
+            print("🟡 Heavy engine failed to load — falling back to LIGHT:", error)
+        return _selected
+
+
+def semantic():
+    return importlib.import_module(ENGINES[selected()]["semantic"])
+
+
+def sanitizer():
+    return importlib.import_module(ENGINES[selected()]["sanitizer"])
+
+
+# ----------------------------------------------------
+# Warm-up + readiness
+# ----------------------------------------------------
+def warm_up(forward: bool = True):
+    """
+    Load the selected engines (model + exemplars for heavy) and compile the
+    active rule pack. Blocking.
+    forward=False loads without running a forward pass — the pre-fork
+    server loads in the parent and lets each worker run its own pass.
+    """
+    _status.update(warming_up=True, error=None)
+    start = time.perf_counter()
+    try:
+        from backend import policy
+
+        while True:
+            mode = selected()
+            try:
+                policy.active()
+                sanitizer()
+                engine = semantic()
+                if not forward and hasattr(engine, "load_model"):
+                    engine.load_model()
+                elif hasattr(engine, "warm_up"):
+                    engine.warm_up()
+                break
+            except Exception:
+                # A failed heavy load has switched the registry to light → warm that up
+                if selected() == mode:
+                    raise
+        _status.update(ready=True, warmup_seconds=round(time.perf_counter() - start, 3))
+    except Exception as e:
+        _status["error"] = f"{type(e).__name__}: {e}"
+        print("⚠ Engine warm-up failed:", _status["error"])
+    finally:
+        _status["warming_up"] = False
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="engine-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> dict:
+    current = dict(_status)
+    if not current["ready"] and not current["warming_up"]:
+        # No warm-up ran (or it was skipped): ready once the model is in memory
+        engine = semantic()
+        current["ready"] = engine.is_loaded() if hasattr(engine, "is_loaded") else True
+    return {"engine": selected(), **current}
@@ -0,0 +1,163 @@
+# backend/detectors/exemplar_index.py
+
+"""
+Exemplar Indexes (pure NumPy)
+-----------------------------
+✓ ExactIndex — brute-force matmul, always correct, fine up to ~10^4 rows
+✓ IVFIndex   — inverted-file ANN: spherical k-means coarse quantizer,
+               each query scans only its n_probe nearest lists
+✓ Same interface → semantic_heavy picks one per corpus size / config
+✓ Rows and queries must already be L2-normalized (dot = cosine)
+✓ IVF layout (centroids, list offsets, list-ordered vectors) can be saved
+  and memory-mapped back → pre-forked workers share the list vectors
+
+Recall/latency knobs (IVF):
+  n_lists  — more lists → smaller lists → faster, but lower recall per probe
+  n_probe  — lists scanned per query → higher recall, higher latency
+"""
+
+import math
+
+import numpy as np
+
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries):
+        """Top-1 per query → (scores (n,), row indices (n,))."""
+        sims = queries @ self.matrix.T
+        idx = np.argmax(sims, axis=1)
+        return sims[np.arange(len(idx)), idx], idx
+
+    def describe(self) -> dict:
+        return {"kind": self.kind, "rows": len(self)}
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    LAYOUT = ("centroids", "offsets", "row_ids", "list_vectors")
+
+    def __init__(self, matrix, n_lists: int = 0, n_probe: int = 8,
+                 train_iters: int = 10, train_sample: int = 20000, seed: int = 0, layout: dict = None):
+        self.matrix = matrix
+        n = len(matrix)
+
+        if layout is not None:
+            # Saved layout (typically memory-mapped) → no training, no copy
+            self.centroids = layout["centroids"]
+            self.offsets = layout["offsets"]
+            self.row_ids = layout["row_ids"]
+            self.list_vectors = layout["list_vectors"]
+            self.n_lists = len(self.centroids)
+            self.n_probe = max(1, min(self.n_lists, n_probe))
+            return
+
+        self.n_lists = max(1, min(n, n_lists or int(4 * math.sqrt(n))))
+        self.n_probe = max(1, min(self.n_lists, n_probe))
+
+        rng = np.random.default_rng(seed)
+        self.centroids = self._train(rng, train_iters, train_sample)
+
+        # Inverted lists: rows grouped by nearest centroid, stored contiguously
+        assign = self._assign(matrix)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.row_ids = order
+        # A private copy until saved: see layout() / exemplar_store.save_arrays
+        self.list_vectors = np.ascontiguousarray(matrix[order])
+
+    def layout(self) -> dict:
+        return {name: getattr(self, name) for name in self.LAYOUT}
+
+    # ----------------------------------------------------
+    # Training (spherical k-means on a sample)
+    # ----------------------------------------------------
+    def _assign(self, vecs, chunk: int = 8192):
+        out = np.empty(len(vecs), dtype=np.int64)
+        for start in range(0, len(vecs), chunk):
+            block = np.asarray(vecs[start:start + chunk])
+            out[start:start + chunk] = np.argmax(block @ self.centroids.T, axis=1)
+        return out
+
+    def _train(self, rng, iters, sample_size):
+        n = len(self.matrix)
+        sample_idx = rng.choice(n, size=min(n, max(sample_size, self.n_lists)), replace=False)
+        sample = np.asarray(self.matrix[np.sort(sample_idx)], dtype=np.float32)
+
+        self.centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(iters):
+            assign = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+
+            # Empty lists keep their previous centroid
+            filled = norms[:, 0] > 0
+            self.centroids[filled] = sums[filled] / norms[filled]
+        return self.centroids
+
+    # ----------------------------------------------------
+    # Search
+    # ----------------------------------------------------
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, n_probe: int = None):
+        """Approximate top-1 per query → (scores (n,), row indices (n,))."""
+        n_probe = max(1, min(self.n_lists, n_probe or self.n_probe))
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe]
+
+        scores = np.full(len(queries), -1.0, dtype=np.float32)
+        rows = np.zeros(len(queries), dtype=np.int64)
+
+        for q, lists in enumerate(probes):
+            for l in lists:
+                start, end = self.offsets[l], self.offsets[l + 1]
+                if start == end:
+                    continue
+                sims = self.list_vectors[start:end] @ queries[q]
+                best = int(np.argmax(sims))
+                if sims[best] > scores[q]:
+                    scores[q] = sims[best]
+                    rows[q] = self.row_ids[start + best]
+        return scores, rows
+
+    def describe(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "kind": self.kind,
+            "rows": len(self),
+            "n_lists": self.n_lists,
+            "n_probe": self.n_probe,
+            "avg_list_size": round(float(sizes.mean()), 1),
+            "max_list_size": int(sizes.max()),
+        }
+
+
+def resolve_kind(kind: str, rows: int, ann_min_rows: int = 20000) -> str:
+    if kind == "auto":
+        return "ivf" if rows >= ann_min_rows else "exact"
+    return kind
+
+
+def build_index(matrix, kind: str = "auto", ann_min_rows: int = 20000, **ivf_params):
+    """
+    kind: "exact" | "ivf" | "auto" (exact below ann_min_rows, IVF above).
+    ivf_params may carry a saved `layout`.
+    """
+    kind = resolve_kind(kind, len(matrix), ann_min_rows)
+    if kind == "exact":
+        return ExactIndex(matrix)
+    if kind == "ivf":
+        return IVFIndex(matrix, **ivf_params)
+    raise ValueError(f"Unknown exemplar index '{kind}' (expected auto | exact | ivf)")
@@ -0,0 +1,190 @@
+# backend/detectors/exemplar_store.py
+
+"""
+Exemplar Embedding Store
+------------------------
+✓ Exemplar embeddings written once to <store>/exemplars-<model>.npy
+✓ Manifest (model, dim, count, text hash) next to it as .json
+✓ Loaded with np.load(mmap_mode="r") → every worker on the host shares
+  one page-cached copy, and startup skips the exemplar encode
+✓ Rebuilt only when the exemplar texts or the model change
+✓ Atomic writes (tmp file + os.replace) — safe with concurrent workers
+✓ Derived arrays (the corpus IVF layout) stored and mapped the same way
+
+Build ahead of deploy:
+    python -m backend.detectors.exemplar_store
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+STORE_VERSION = 1
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "exemplars")
+STORE_DIR = os.getenv("EXEMPLAR_STORE_DIR", DEFAULT_STORE_DIR)
+
+
+def texts_hash(groups: dict) -> str:
+    """Hash of group names + exemplar texts, in order."""
+    h = hashlib.sha256()
+    for group, texts in groups.items():
+        h.update(group.encode("utf-8") + b"\0")
+        for t in texts:
+            h.update(t.encode("utf-8") + b"\0")
+        h.update(b"\1")
+    return h.hexdigest()
+
+
+def _paths(model_name: str, store_dir: str, name: str = "exemplars"):
+    safe = model_name.replace("/", "__")
+    base = os.path.join(store_dir, f"{name}-{safe}")
+    return base + ".npy", base + ".json"
+
+
+def _atomic_write(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(model_name: str, groups: dict, store_dir: str = None, name: str = "exemplars"):
+    """The stored matrix (read-only memmap) if it matches model + texts, else None."""
+    npy_path, manifest_path = _paths(model_name, store_dir or STORE_DIR, name)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    count = sum(len(t) for t in groups.values())
+    if (
+        manifest.get("version") != STORE_VERSION
+        or manifest.get("model") != model_name
+        or manifest.get("text_hash") != texts_hash(groups)
+        or manifest.get("count") != count
+    ):
+        return None
+
+    try:
+        matrix = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    if matrix.shape != (count, manifest.get("dim")):
+        return None
+    return matrix
+
+
+def save(model_name: str, groups: dict, matrix, store_dir: str = None, name: str = "exemplars"):
+    store_dir = store_dir or STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+    npy_path, manifest_path = _paths(model_name, store_dir, name)
+
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    manifest = {
+        "version": STORE_VERSION,
+        "model": model_name,
+        "dim": int(matrix.shape[1]),
+        "count": int(matrix.shape[0]),
+        "dtype": "float32",
+        "text_hash": texts_hash(groups),
+        "groups": {g: len(t) for g, t in groups.items()},
+    }
+
+    # matrix first, manifest last → a readable manifest always has its matrix
+    _atomic_write(npy_path, lambda f: np.save(f, matrix))
+    _atomic_write(manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+
+def load_or_build(model_name: str, groups: dict, build, store_dir: str = None, name: str = "exemplars"):
+    """
+    build(list_of_texts) -> (n, dim) float32 matrix, called only on a miss.
+    Returns (matrix, built). Falls back to the in-memory matrix if the
+    store directory is not writable. `name` separates stores per model
+    (built-in exemplars vs the external attack corpus).
+    """
+    matrix = load(model_name, groups, store_dir, name)
+    if matrix is not None:
+        return matrix, False
+
+    texts = [t for ts in groups.values() for t in ts]
+    matrix = np.ascontiguousarray(build(texts), dtype=np.float32)
+
+    try:
+        save(model_name, groups, matrix, store_dir, name)
+        stored = load(model_name, groups, store_dir, name)
+        if stored is not None:
+            matrix = stored
+    except OSError as e:
+        print("⚠ Exemplar store not writable — keeping embeddings in memory:", e)
+
+    return matrix, True
+
+
+# ----------------------------------------------------
+# Derived arrays (e.g. an IVF layout), keyed on a caller-computed tag
+# ----------------------------------------------------
+def _array_paths(model_name: str, store_dir: str, name: str, arrays):
+    npy_path, manifest_path = _paths(model_name, store_dir, name)
+    base = npy_path[:-len(".npy")]
+    return {a: f"{base}.{a}.npy" for a in arrays}, manifest_path
+
+
+def load_arrays(model_name: str, tag: str, name: str, arrays, store_dir: str = None):
+    """{array: read-only memmap} if stored under the same model + tag, else None."""
+    paths, manifest_path = _array_paths(model_name, store_dir or STORE_DIR, name, arrays)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != STORE_VERSION or manifest.get("model") != model_name or manifest.get("tag") != tag:
+        return None
+
+    out = {}
+    for a, path in paths.items():
+        try:
+            out[a] = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if list(out[a].shape) != manifest.get("shapes", {}).get(a):
+            return None
+    return out
+
+
+def save_arrays(model_name: str, tag: str, name: str, arrays: dict, store_dir: str = None):
+    store_dir = store_dir or STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+    paths, manifest_path = _array_paths(model_name, store_dir, name, arrays)
+
+    arrays = {a: np.ascontiguousarray(v) for a, v in arrays.items()}
+    manifest = {
+        "version": STORE_VERSION,
+        "model": model_name,
+        "tag": tag,
+        "shapes": {a: list(v.shape) for a, v in arrays.items()},
+    }
+    for a, v in arrays.items():
+        _atomic_write(paths[a], lambda f, v=v: np.save(f, v))
+    _atomic_write(manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+
+def main():
+    from backend.detectors import semantic_heavy
+
+    semantic_heavy.load_model()
+    _, manifest_path = _paths(semantic_heavy.MODEL_NAME, STORE_DIR)
+    print(f"✅ Exemplar store ready: {manifest_path}")
+    print(f"   {len(semantic_heavy.EXEMPLAR_LABELS)} exemplars × {semantic_heavy.EXEMPLAR_MATRIX.shape[1]} dims")
+    if semantic_heavy.CORPUS_INDEX is not None:
+        print(f"   corpus: {semantic_heavy.CORPUS_INDEX.describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/detectors/keywords.py
+
+"""
+Shared Keyword Matcher
+----------------------
+✓ One multi-pattern structure per keyword list, built once at import
+✓ Keywords are folded into a trie and compiled to a single regex
+  (sre walks it like an Aho-Corasick goto table, in C)
+✓ Reports EVERY hit with offsets — overlapping ones too ("harm" in "self harm")
+✓ first() keeps the old "first keyword in list order" semantics
+✓ Pure stdlib — safe for cloud mode
+"""
+
+import re
+from typing import Iterable, List, Optional, Tuple
+
+_END = ""
+
+
+def _build_trie(keywords):
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[_END] = kw
+    return trie
+
+
+def _trie_to_regex(node) -> str:
+    branches = [re.escape(ch) + _trie_to_regex(child)
+                for ch, child in sorted(node.items()) if ch != _END]
+
+    if not branches:
+        return ""
+
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    # A keyword ends here → the longer continuation is optional (greedy)
+    if _END in node:
+        return "(?:" + body + ")?"
+    return body
+
+
+class KeywordMatcher:
+    """
+    Multi-keyword substring matcher.
+
+    Matching is a single left-to-right scan: at each position the compiled
+    trie returns the longest keyword starting there, and the shorter
+    keywords on the same trie path are read back without rescanning.
+    Callers pass text that is already lowercased.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = [kw for kw in dict.fromkeys(keywords) if kw]
+        self._priority = {kw: i for i, kw in enumerate(self.keywords)}
+        self._trie = _build_trie(self.keywords)
+        self._regex = re.compile("(?=(" + _trie_to_regex(self._trie) + "))") if self.keywords else None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """Every (start, end, keyword) occurrence, ordered by start offset."""
+        if self._regex is None or not text:
+            return []
+
+        hits = []
+        for m in self._regex.finditer(text):
+            start = m.start()
+            node = self._trie
+            for i, ch in enumerate(m.group(1), start + 1):
+                node = node[ch]
+                if _END in node:
+                    hits.append((start, i, node[_END]))
+        return hits
+
+    def search(self, text: str) -> bool:
+        return self._regex is not None and self._regex.search(text) is not None
+
+    def first(self, text: str) -> Optional[str]:
+        """The highest-priority (earliest listed) keyword present in text."""
+        if not self.search(text):
+            return None
+        return min((kw for _, _, kw in self.find_all(text)), key=self._priority.__getitem__)
+
+    def matched(self, text: str) -> List[str]:
+        """Distinct keywords present in text, in list order."""
+        found = {kw for _, _, kw in self.find_all(text)}
+        return [kw for kw in self.keywords if kw in found]
@@ -1,8 +1,236 @@
 # backend/detectors/logger.py
+"""
+Buffered Event Logger
+---------------------
+✓ log_event() only enqueues — file I/O happens on a background thread
+✓ Bounded queue with "drop" (default) or "block" policy when full
+✓ Batched writes: flush every N events or every T seconds
+✓ Size / time based rotation, closed segments gzipped
+✓ Rotation + append under an flock on <log>.lock → pre-fork workers
+  sharing one file never rotate it twice or write into a closed segment
+✓ LOG_ASYNC=0 writes inline but through the same rotation check
+✓ Keeps the last LOG_BACKUPS segments
+"""
+
+import atexit
+import contextlib
 import datetime
+import glob
+import gzip
 import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:     # non-POSIX: rotation is only serialized within the process
+    fcntl = None
+
+LOG_FILE = os.getenv("PROMPTGUARD_LOG_FILE", "promptguard.log")
+
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")       # "drop" | "block"
+LOG_FLUSH_EVERY = int(os.getenv("LOG_FLUSH_EVERY", 200))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", 24 * 3600))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", 10))
+
+
+def _format(log_entry: dict) -> str:
+    try:
+        return json.dumps(log_entry, ensure_ascii=False) + "\n"
+    except Exception as e:
+        return "LOGGING ERROR: " + str(e) + "\n"
+
+
+class LogWriter:
+    """Single background writer that owns the log file."""
+
+    def __init__(self, path, queue_size=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY,
+                 flush_every=LOG_FLUSH_EVERY, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_bytes=LOG_MAX_BYTES, rotate_seconds=LOG_ROTATE_SECONDS, backups=LOG_BACKUPS):
+        self.path = path
+        self.queue_size = queue_size
+        self.policy = policy
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._opened_at = time.time()
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    # ----------------------------------------------------
+    # Worker lifecycle (lazy, and restarted after fork)
+    # ----------------------------------------------------
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name="promptguard-log", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _run(self):
+        q = self._queue
+        while True:
+            batch = []
+            flush_waiters = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.flush_every:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    flush_waiters.append(item)
+                    break
+                batch.append(item)
+
+            if batch:
+                self._write(batch)
+            for ev in flush_waiters:
+                ev.set()
+
+    # ----------------------------------------------------
+    # File handling (writer thread, or the caller with LOG_ASYNC=0)
+    # ----------------------------------------------------
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Serializes rotate + append across threads and pre-fork workers."""
+        with self._io_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
 
-LOG_FILE = "promptguard.log"
+    def _write(self, lines):
+        data = "".join(lines)
+        try:
+            with self._file_lock():
+                segment = self._maybe_rotate(len(data.encode("utf-8")))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(data)
+            self.written += len(lines)
+            # Compression happens outside the lock — other workers keep writing
+            if segment:
+                self._compress(segment)
+        except Exception as e:
+            print("⚠ Log write failed:", e)
+
+    def write_now(self, line: str):
+        """Synchronous write (LOG_ASYNC=0) — same locking and rotation."""
+        self._write([line])
+
+    def _rotated_at(self) -> float:
+        # The lock file's mtime is shared by every worker → one rotation clock
+        try:
+            return os.path.getmtime(self.path + ".lock")
+        except OSError:
+            return self._opened_at
+
+    def _maybe_rotate(self, incoming: int):
+        """Call with the file lock held. Returns the closed segment, if any."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            self._opened_at = time.time()
+            return None
+
+        too_big = self.max_bytes > 0 and size + incoming > self.max_bytes
+        too_old = self.rotate_seconds > 0 and time.time() - self._rotated_at() >= self.rotate_seconds
+        if size and (too_big or too_old):
+            return self._close_segment()
+        return None
+
+    def _close_segment(self) -> str:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        segment = f"{self.path}.{stamp}.{os.getpid()}"
+        os.replace(self.path, segment)
+        self._opened_at = time.time()
+        try:
+            os.utime(self.path + ".lock")
+        except OSError:
+            pass
+        self.rotations += 1
+        return segment
+
+    def rotate(self):
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                return
+            segment = self._close_segment()
+        self._compress(segment)
+
+    def _compress(self, segment: str):
+        with open(segment, "rb") as src, gzip.open(segment + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(segment)
+
+        old = sorted(glob.glob(glob.escape(self.path) + ".*.gz"))
+        for path in old[:max(0, len(old) - self.backups)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ----------------------------------------------------
+    # Public API
+    # ----------------------------------------------------
+    def submit(self, line: str):
+        self._ensure_worker()
+        if self.policy == "block":
+            self._queue.put(line)
+            return
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far is on disk."""
+        if self._pid != os.getpid():
+            return True
+        ev = threading.Event()
+        self._queue.put(ev)
+        return ev.wait(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "policy": self.policy,
+        }
+
+
+LOG_WRITER = LogWriter(LOG_FILE)
+atexit.register(LOG_WRITER.flush)
 
 
 def log_event(event: dict):
@@ -20,20 +248,18 @@ def log_event(event: dict):
         }
     """
 
-    try:
-        log_entry = {
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "prompt": event.get("prompt"),
-            "final_safe": event.get("final_safe"),
-            "reason": event.get("reason"),
-            "rule_category": event.get("rule_category"),
-            "semantic_score": event.get("semantic_score"),
-            "sanitized": event.get("sanitized"),
-        }
+    log_entry = {
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "prompt": event.get("prompt"),
+        "final_safe": event.get("final_safe"),
+        "reason": event.get("reason"),
+        "rule_category": event.get("rule_category"),
+        "semantic_score": event.get("semantic_score"),
+        "sanitized": event.get("sanitized"),
+    }
 
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+    if not LOG_ASYNC:
+        LOG_WRITER.write_now(_format(log_entry))
+        return
 
-    except Exception as e:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write("LOGGING ERROR: " + str(e) + "\n")
+    LOG_WRITER.submit(_format(log_entry))
@@ -0,0 +1,217 @@
+# backend/detectors/metrics.py
+
+"""
+Metrics (Prometheus text format, no client library)
+---------------------------------------------------
+✓ Per-stage latency histograms: with stage("rules"): ...
+✓ Counters with labels (verdicts by category)
+✓ Gauges read at scrape time (cache hit rates, queue depths)
+✓ Optional per-request timings: with collect_timings() as t: ... → {stage: ms}
+✓ Thread-safe; contextvars → timings follow the request, not the thread pool
+
+Stages nest: "semantic" includes "semantic_encode" + "semantic_similarity".
+"""
+
+import contextvars
+from bisect import bisect_left
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds — sub-ms rules up to multi-second Gemini calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.label_names), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(v)}" for key, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}               # label values -> [per-bucket counts..., overflow, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-2]):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read from a callback at scrape time: fn() -> {label tuple: value}.
+    kind="counter" for totals kept elsewhere (e.g. cache hit counts).
+    """
+
+    def __init__(self, name: str, help_text: str, fn, labels: tuple = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> list:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(v)}" for key, v in sorted(values.items())]
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering (module reload, tests) replaces the old metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "promptguard_stage_seconds", "Time spent per pipeline stage.", labels=("stage",),
+))
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "promptguard_request_seconds", "End-to-end request latency per route.", labels=("route",),
+))
+
+VERDICTS = REGISTRY.register(Counter(
+    "promptguard_verdicts_total", "Analyzed prompts by verdict and category.", labels=("verdict", "category"),
+))
+
+
+def gauge(name: str, help_text: str, fn, labels: tuple = (), kind: str = "gauge"):
+    return REGISTRY.register(Gauge(name, help_text, fn, labels, kind))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ----------------------------------------------------
+# Stage timers + per-request timings
+# ----------------------------------------------------
+_timings = contextvars.ContextVar("promptguard_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block into promptguard_stage_seconds{stage=name} (+ request timings if collecting)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed * 1000
+
+
+@contextmanager
+def collect_timings():
+    """Collects every stage() inside the block → {stage: ms} (summed if a stage repeats)."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_verdict(result: dict):
+    if result.get("final_safe", True):
+        VERDICTS.inc(verdict="allowed", category="NONE")
+        return
+
+    rule = result.get("rule_details") or {}
+    if not rule.get("safe", True):
+        category = (rule.get("category") or "RULE").upper()
+    else:
+        category = "SEMANTIC"
+    VERDICTS.inc(verdict="blocked", category=category)
@@ -0,0 +1,225 @@
+# backend/detectors/normalize.py
+
+"""
+Prompt Normalization (one pre-pass per request)
+-----------------------------------------------
+✓ NFKC per code point (fullwidth, ligatures, math letters → plain)
+✓ casefold (ß → ss, İ → i)
+✓ Zero-width / bidi / soft-hyphen characters dropped
+✓ Diacritics stripped from Latin letters ("ïgnore" → "ignore")
+✓ Cyrillic/Greek lookalikes folded inside words that mix in Latin
+  letters ("pаssword" with a Cyrillic а); all-Cyrillic words are left alone
+✓ Whitespace runs → one space, none at the ends
+✓ Offset map back to the original → sanitizers edit the user's text,
+  keeping its casing and formatting
+✓ ASCII fast path: lower + split/join in C, nothing else precomputed
+✓ Non-ASCII: only the non-ASCII chars are folded in Python; whitespace is
+  collapsed in C like the ASCII path
+✓ Whitespace is mapped per span (word index → str.split in C), so a
+  prompt with a few hits never pays for a whole-prompt offset table
+
+Every detector accepts a NormalizedPrompt or a plain string (normalized on
+the spot), so the analyzer builds it once and passes the same object along.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
+
+# Lookalikes that survive NFKC + casefold (lowercase forms)
+HOMOGLYPHS = {
+    # Cyrillic
+    "а": "a", "с": "c", "ԁ": "d", "е": "e", "һ": "h", "і": "i", "ј": "j",
+    "ӏ": "l", "о": "o", "р": "p", "ԛ": "q", "ѕ": "s", "ԝ": "w", "х": "x", "у": "y",
+    # Greek
+    "α": "a", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "υ": "u",
+    # Latin extensions
+    "ı": "i", "ɑ": "a", "ɡ": "g", "ʀ": "r",
+}
+_HOMOGLYPH_TABLE = str.maketrans(HOMOGLYPHS)
+_HOMOGLYPH_CLASS = "[" + "".join(HOMOGLYPHS) + "]"
+
+# A word with a lookalike and at least one ASCII letter → fold the whole word
+_MIXED_WORD = re.compile(
+    rf"\w*(?:{_HOMOGLYPH_CLASS}\w*[a-z]|[a-z]\w*{_HOMOGLYPH_CLASS})\w*"
+)
+
+_HOMOGLYPH = re.compile(_HOMOGLYPH_CLASS)
+
+# Runs of non-ASCII characters — the only ones folded char by char
+_NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+
+def _dropped(ch: str) -> bool:
+    """Invisible characters removed outright (zero-width, bidi, soft hyphen)."""
+    return unicodedata.category(ch) == "Cf"
+
+
+@lru_cache(maxsize=8192)
+def _fold_char(ch: str) -> str:
+    if _dropped(ch):
+        return ""
+    folded = unicodedata.normalize("NFKC", ch)
+    decomposed = unicodedata.normalize("NFD", folded)
+    # Latin letter + combining marks → bare letter
+    if decomposed[0].isascii() and all(unicodedata.category(c) == "Mn" for c in decomposed[1:]):
+        folded = decomposed[0]
+    folded = folded.casefold()
+    if folded.isspace():
+        return " "
+    return " ".join(folded.split()) if any(c.isspace() for c in folded) else folded
+
+
+def _fold_homoglyphs(text: str) -> str:
+    # 1:1 replacements → length (and the offset map) unchanged
+    if not _HOMOGLYPH.search(text):
+        return text
+    return _MIXED_WORD.sub(lambda m: m.group().translate(_HOMOGLYPH_TABLE), text)
+
+
+def _fold(original: str):
+    """
+    (inter, folds) for non-ASCII input: ASCII lowercased, each non-ASCII
+    char folded, whitespace untouched. Only the folded pieces are recorded
+    — folds = (starts, lengths, src_starts, src_ends), positions in inter —
+    everything between them maps 1:1, so the Python loop runs per non-ASCII
+    char, not per word.
+    """
+    parts, starts, lengths, src_starts, src_ends = [], [], [], [], []
+    pos = i = 0
+    last = ""
+
+    for m in _NON_ASCII.finditer(original):
+        a, b = m.span()
+        if a > i:
+            chunk = original[i:a].lower()
+            parts.append(chunk)
+            pos += len(chunk)
+            last = chunk[-1]
+        for j in range(a, b):
+            ch = original[j]
+            if unicodedata.category(ch) == "Mn" and last.isascii() and last.isalpha():
+                folded = ""                 # stray combining mark on a Latin letter
+            else:
+                folded = _fold_char(ch)
+            parts.append(folded)
+            starts.append(pos)
+            lengths.append(len(folded))
+            src_starts.append(j)
+            src_ends.append(j + 1)
+            pos += len(folded)
+            last = folded[-1:] or last
+        i = b
+    if i < len(original):
+        parts.append(original[i:].lower())
+
+    return "".join(parts), (starts, lengths, src_starts, src_ends)
+
+
+class NormalizedPrompt:
+    """
+    original — the prompt as given
+    text     — folded form every detector matches / encodes
+    span()   — maps a text span back to the original
+    aligned  — text is original.lower() char for char (ASCII, no
+               whitespace to collapse) → spans need no mapping at all
+    """
+
+    __slots__ = ("original", "text", "_inter", "_folds", "_cursor")
+
+    def __init__(self, original: str):
+        self.original = original or ""
+        self._cursor = (0, 0)
+        if self.original.isascii():
+            self._inter, self._folds = None, None
+            self.text = " ".join(self.original.lower().split())
+        else:
+            self._inter, self._folds = _fold(self.original)
+            self.text = _fold_homoglyphs(" ".join(self._inter.split()))
+
+    def __repr__(self):
+        return f"NormalizedPrompt({self.text[:40]!r})"
+
+    def __bool__(self):
+        return bool(self.text)
+
+    @property
+    def aligned(self) -> bool:
+        return self._folds is None and len(self.text) == len(self.original)
+
+    def _word_start(self, word: int) -> int:
+        """Start of the given word (0-based) in inter (the original for ASCII)."""
+        src = self.original if self._inter is None else self._inter
+        # Spans arrive left to right → continue from the previous lookup
+        done, pos = self._cursor
+        if word < done:
+            done, pos = 0, 0
+        rest = src[pos:].split(None, word - done)[-1]
+        start = len(src) - len(rest)
+        self._cursor = (word, start)
+        return start
+
+    def _inter_pos(self, pos: int) -> int:
+        # text and inter hold the same words; only the whitespace between differs
+        text = self.text
+        word = text.count(" ", 0, pos)
+        return self._word_start(word) + pos - (text.rfind(" ", 0, pos) + 1)
+
+    def _unfold(self, pos: int, is_end: bool) -> int:
+        # inter position → original; inside a folded piece → its whole source
+        if self._folds is None:
+            return pos
+        starts, lengths, src_starts, src_ends = self._folds
+        k = bisect_right(starts, pos - 1 if is_end else pos) - 1
+        if k < 0:
+            return pos
+        if starts[k] <= pos - is_end < starts[k] + lengths[k]:
+            return src_ends[k] if is_end else src_starts[k]
+        return src_ends[k] + pos - starts[k] - lengths[k]
+
+    def _absorb(self, end: int) -> int:
+        # A span ending at a letter also takes the invisible chars glued to it
+        original = self.original
+        while end < len(original) and (_dropped(original[end]) or unicodedata.category(original[end]) == "Mn"):
+            end += 1
+        return end
+
+    def span(self, start: int, end: int):
+        """(start, end) in text → (start, end) in original."""
+        if not self.text:
+            return 0, 0
+        end = max(end, start + 1)
+
+        # A span starting on a space starts where the whitespace run does;
+        # one ending on a space takes the whole run
+        orig_start = self._inter_pos(start)
+        if self.text[end - 1] == " ":
+            orig_end = self._inter_pos(end)
+        else:
+            orig_end = self._inter_pos(end - 1) + 1
+        return self._unfold(orig_start, False), self._absorb(self._unfold(orig_end, True))
+
+    def replace_spans(self, spans) -> str:
+        """
+        spans: [(start, end, replacement)] in text, sorted and disjoint →
+        the ORIGINAL with those spans replaced. Spans that collapse onto an
+        already replaced piece of the original are skipped.
+        """
+        parts, pos = [], 0
+        for start, end, replacement in spans:
+            a, b = self.span(start, end)
+            if a < pos:
+                continue
+            parts.append(self.original[pos:a])
+            parts.append(replacement)
+            pos = b
+        parts.append(self.original[pos:])
+        return "".join(parts)
+
+
+def normalized(prompt) -> NormalizedPrompt:
+    """The prompt as a NormalizedPrompt (already built ones pass through)."""
+    if isinstance(prompt, NormalizedPrompt):
+        return prompt
+    return NormalizedPrompt(prompt)
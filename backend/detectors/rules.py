@@ -3,6 +3,10 @@ print("🔥 RULES FINGERPRINT: VERSION C+ — HARDENED ILLEGAL & VIOLENCE DETECT
 import re
 from typing import Optional, Dict
 
+from backend import policy
+from backend.detectors.keywords import KeywordMatcher
+from backend.detectors.normalize import normalized
+
 """
 HARDENED PRODUCTION RULES
 -------------------------
@@ -12,6 +16,9 @@ HARDENED PRODUCTION RULES
 ✓ Blocks hacking (“hack an account”, “breach system”)
 ✓ Blocks dead-body disposal queries
 ✓ Keeps educational whitelist
+✓ Single-pass compiled scan (same priority as per-pattern loop)
+✓ Tables below are the built-in defaults; a rule pack can replace them
+✓ Matches the shared normalized text (NFKC, casefold, homoglyphs folded)
 ✓ 100% compatible with analyzer.py
 """
 
@@ -110,58 +117,207 @@ SELF_HARM_PATTERNS = _compile_list(SELF_HARM_PATTERNS_RAW)
 HATE_SPEECH_PATTERNS = _compile_list(HATE_SPEECH_PATTERNS_RAW)
 
 # -------------------------------------------------------
-# 7. Helper
+# 7. Single-pass rule engine
+# -------------------------------------------------------
+_RULE_HEAD = re.compile(r"\\b\(?[a-z]")
+
+
+def _uncapture(raw: str) -> Optional[str]:
+    """
+    raw with its capturing groups made non-capturing, or None if the
+    pattern can't join the merged alternation. Backreferences, named
+    groups and conditionals depend on group numbering, which shifts once
+    rules are joined. Escapes and character classes like [(] stay as-is.
+    """
+    out = []
+    i, n = 0, len(raw)
+    in_class = False
+    while i < n:
+        c = raw[i]
+        if c == "\\":
+            if not in_class and raw[i + 1:i + 2].isdigit() and raw[i + 1] != "0":
+                return None                     # \1 … backreference
+            out.append(raw[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            out.append(c)
+            i += 1
+            # Leading ^ and ] are members, not the end of the class
+            for lead in ("^", "]"):
+                if raw.startswith(lead, i):
+                    out.append(lead)
+                    i += 1
+            continue
+        elif c == "(":
+            if not raw.startswith("?", i + 1):
+                out.append("(?:")
+                i += 1
+                continue
+            if raw.startswith(("(?P", "(?(", "(?<"), i) and not raw.startswith(("(?<=", "(?<!"), i):
+                return None                     # named group / (?P=name) / conditional
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _merge_body(raw: str) -> Optional[str]:
+    body = _uncapture(raw[2:])
+    if body is None:
+        return None
+    # Inline global flags etc. only compile at the start of a pattern
+    try:
+        re.compile(r"\b(?:" + body + ")")
+    except re.error:
+        return None
+    return body
+
+
+class CompiledRuleset:
+    """
+    Merges every rule into ONE alternation scanned over the lowercased prompt.
+
+    Priority is the order of `categories` and then the order of patterns
+    inside each category — identical to checking every pattern in turn.
+    Clean prompts cost a single scan; on a hit, only the patterns that
+    rank above the current winner are re-checked (again as one alternation).
+    Patterns that can't be merged (backreferences, named groups, inline
+    flags) are searched one by one, and only while they still outrank
+    the winner.
+    """
+
+    def __init__(self, categories):
+        # categories: [(category, message, [raw patterns]), ...] in priority order
+        self.rules = []
+        for category, message, patterns in categories:
+            for raw in patterns:
+                if not _RULE_HEAD.match(raw):
+                    raise ValueError(f"Rule must start with \\b and a lowercase word: {raw!r}")
+                self.rules.append((category, message, raw, re.compile(raw)))
+
+        self._bodies = [_merge_body(raw) for _, _, raw, _ in self.rules]
+        self._fallback = [i for i, body in enumerate(self._bodies) if body is None]
+        self._prefix_scanners = {}
+        self._scanner = self._prefix_scanner(len(self.rules))
+
+    def _prefix_scanner(self, count):
+        # Alternation of the first `count` rules. Every rule starts with
+        # \b + a lowercase letter, so the boundary check is hoisted out of
+        # the alternation and non-word positions are skipped outright.
+        # Groups become non-capturing so sre can use its literal fast path.
+        # None when none of those rules could be merged.
+        if count not in self._prefix_scanners:
+            bodies = [body for body in self._bodies[:count] if body is not None]
+            self._prefix_scanners[count] = re.compile(r"\b(?=[a-z])(?:" + "|".join(bodies) + ")") if bodies else None
+        return self._prefix_scanners[count]
+
+    def _rule_at(self, text, pos, limit):
+        for i in range(limit):
+            if self.rules[i][3].match(text, pos):
+                return i
+        return None
+
+    def match(self, text):
+        """
+        text must already be lowercased.
+        Returns (category, message, raw_pattern) of the highest-priority hit, or None.
+        """
+        best = self._merged_match(text)
+
+        for i in self._fallback:
+            if best is not None and i >= best:
+                break
+            if self.rules[i][3].search(text):
+                best = i
+                break
+
+        if best is None:
+            return None
+        category, message, raw, _ = self.rules[best]
+        return category, message, raw
+
+    def _merged_match(self, text):
+        m = self._scanner.search(text) if self._scanner else None
+        if m is None:
+            return None
+
+        best = self._rule_at(text, m.start(), len(self.rules))
+
+        # A higher-priority rule may still match further right
+        while best:
+            scanner = self._prefix_scanner(best)
+            m = scanner.search(text, m.start() + 1) if scanner else None
+            if m is None:
+                break
+            best = self._rule_at(text, m.start(), best)
+        return best
+
+
+RULE_CATEGORIES = [
+    ("JAILBREAK", "Jailbreak intent detected", JAILBREAK_PATTERNS_RAW),
+    ("ILLEGAL", "Illegal/harmful intent detected", ILLEGAL_PATTERNS_RAW),
+    ("SELF_HARM", "Self-harm detected", SELF_HARM_PATTERNS_RAW),
+    ("HATE_SPEECH", "Hate speech detected", HATE_SPEECH_PATTERNS_RAW),
+]
+
+RULESET = CompiledRuleset(RULE_CATEGORIES)
+
+SAFE_CONTEXT_MATCHER = KeywordMatcher(SAFE_CONTEXT_KEYWORDS)
+
+# -------------------------------------------------------
+# 7b. Rule-pack section (backend/policy.py)
 # -------------------------------------------------------
-def _match_any(compiled, text):
-    for cre, raw in compiled:
-        m = cre.search(text)
-        if m:
-            return {"pattern": raw, "match_str": m.group(0)}
-    return None
+def default_section() -> dict:
+    return {
+        "safe_context": list(SAFE_CONTEXT_KEYWORDS),
+        "categories": [
+            {"category": category, "message": message, "patterns": list(patterns)}
+            for category, message, patterns in RULE_CATEGORIES
+        ],
+    }
+
+
+def compile_section(section: dict) -> dict:
+    categories = [
+        (c["category"], c["message"], policy.strings(c["patterns"], f"rules.{c['category']}.patterns"))
+        for c in section["categories"]
+    ]
+    return {
+        "safe_context": KeywordMatcher([kw.lower() for kw in policy.strings(section["safe_context"], "rules.safe_context")]),
+        "ruleset": CompiledRuleset(categories),
+    }
+
 
 # -------------------------------------------------------
 # 8. PUBLIC API — check_rules()
 # -------------------------------------------------------
-def check_rules(prompt: str) -> dict:
-
-    if not prompt or not prompt.strip():
+def check_rules(prompt) -> dict:
+    """prompt: str or NormalizedPrompt."""
+    text = normalized(prompt).text
+    if not text:
         return {"safe": True, "matched_pattern": None, "category": None, "message": "Empty prompt"}
 
-    text = prompt.strip()
-
-    # 1 — educational whitelist
-    for kw in SAFE_CONTEXT_KEYWORDS:
-        if kw in text.lower():
-            return {
-                "safe": True,
-                "matched_pattern": None,
-                "category": None,
-                "message": f"Educational context detected → '{kw}'"
-            }
-
-    # 2 — jailbreak
-    jb = _match_any(JAILBREAK_PATTERNS, text)
-    if jb:
-        return {"safe": False, "matched_pattern": jb["pattern"], "category": "JAILBREAK",
-                "message": "Jailbreak intent detected"}
-
-    # 3 — illegal
-    illegal = _match_any(ILLEGAL_PATTERNS, text)
-    if illegal:
-        return {"safe": False, "matched_pattern": illegal["pattern"], "category": "ILLEGAL",
-                "message": "Illegal/harmful intent detected"}
-
-    # 4 — self harm
-    sh = _match_any(SELF_HARM_PATTERNS, text)
-    if sh:
-        return {"safe": False, "matched_pattern": sh["pattern"], "category": "SELF_HARM",
-                "message": "Self-harm detected"}
-
-    # 5 — hate speech
-    hs = _match_any(HATE_SPEECH_PATTERNS, text)
-    if hs:
-        return {"safe": False, "matched_pattern": hs["pattern"], "category": "HATE_SPEECH",
-                "message": "Hate speech detected"}
+    tables = policy.section("rules")
+
+    # 1 — educational whitelist (first keyword in list order wins)
+    kw = tables["safe_context"].first(text)
+    if kw:
+        return {
+            "safe": True,
+            "matched_pattern": None,
+            "category": None,
+            "message": f"Educational context detected → '{kw}'"
+        }
+
+    # 2 — jailbreak → illegal → self harm → hate speech
+    hit = tables["ruleset"].match(text)
+    if hit:
+        category, message, pattern = hit
+        return {"safe": False, "matched_pattern": pattern, "category": category,
+                "message": message}
 
     # safe
     return {"safe": True, "matched_pattern": None, "category": None, "message": "No unsafe patterns detected"}
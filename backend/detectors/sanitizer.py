@@ -5,16 +5,14 @@ Auto-Switch Sanitizer
 ---------------------
 ✓ Uses HEAVY sanitizer locally
 ✓ Uses LIGHT sanitizer on cloud (Railway/Render)
-✓ Never crashes even if heavy import fails
+✓ Choice is made once by the engine registry (backend.detectors.engines)
 """
 
-try:
-    # Heavy mode (local machine)
-    from backend.detectors.sanitizer_heavy import sanitize_prompt
-    print("🔵 Using HEAVY sanitizer (local mode)")
-except Exception as e:
-    # Cloud-safe fallback
-    from backend.detectors.sanitizer_light import sanitize_prompt
-    print("🟢 Using LIGHT sanitizer (cloud mode)")
+from backend.detectors import engines
+
+
+def sanitize_prompt(prompt: str) -> str:
+    return engines.sanitizer().sanitize_prompt(prompt)
+
 
 __all__ = ["sanitize_prompt"]
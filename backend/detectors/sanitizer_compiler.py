@@ -0,0 +1,193 @@
+# backend/detectors/sanitizer_compiler.py
+
+"""
+Sanitizer Compiler
+------------------
+Turns the sanitizer rule tables into one-scan matchers, with output
+identical to running the tables rule by rule:
+
+✓ RewriteTable    — first matching rule (list order) → its rewrite.
+                    Built on CompiledRuleset: one alternation scan, higher
+                    priority rules re-checked only on a hit.
+✓ KeywordRedactor — case-insensitive literal keywords, applied in list
+                    order, each replaced by a marker. One trie scan finds
+                    every (overlapping) hit; earlier keywords claim their
+                    span first ("self harm" beats the "harm" inside it),
+                    then the output is joined once.
+✓ WordReplacer    — table of \\bword\\b → replacement plus whitespace
+                    collapsing, as ONE re.sub with a callback (only for
+                    words and whitespace runs that actually change).
+
+The *_normalized variants match on NormalizedPrompt.text (so obfuscated
+spellings hit too) and edit the original through its offset map. ASCII
+prompts whose text lines up with the original (or differs only in
+whitespace no keyword spans) skip the map and take the one-pass path.
+"""
+
+import re
+from bisect import bisect_left, insort
+
+from backend.detectors.keywords import KeywordMatcher
+from backend.detectors.normalize import normalized
+from backend.detectors.rules import CompiledRuleset
+
+_LITERAL = re.compile(r"[a-z0-9 ]+")
+_WHOLE_WORD = re.compile(r"\\b([a-z0-9 ]+)\\b")
+
+
+class RewriteTable:
+    """rules: [(pattern, rewrite)] in priority order. Patterns start with \\b + lowercase."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._ruleset = CompiledRuleset([(i, rewrite, [pattern]) for i, (pattern, rewrite) in enumerate(self.rules)])
+
+    def first(self, text: str, lowered: bool = False):
+        """Rewrite of the highest-priority rule matching text (any case), or None."""
+        hit = self._ruleset.match(text if lowered else text.lower())
+        return hit[1] if hit else None
+
+
+class KeywordRedactor:
+    """
+    Equivalent to:
+        for kw in keywords: text = re.sub(kw, replacement, text, flags=re.IGNORECASE)
+    for lowercase literal keywords whose replacement can't create new hits.
+    """
+
+    def __init__(self, keywords, replacement: str):
+        self.keywords = list(dict.fromkeys(keywords))
+        for kw in self.keywords:
+            if not _LITERAL.fullmatch(kw):
+                raise ValueError(f"Keyword must be a lowercase literal: {kw!r}")
+
+        self.replacement = replacement
+        self.matcher = KeywordMatcher(self.keywords)
+        self._priority = {kw: i for i, kw in enumerate(self.keywords)}
+        self._spaced = any(" " in kw for kw in self.keywords)
+
+        if self.matcher.find_all(replacement.lower()):
+            raise ValueError(f"Replacement {replacement!r} contains a keyword")
+
+    def spans(self, lowered: str) -> list:
+        """Sorted (start, end) spans that the sequential replacements would remove."""
+        by_keyword = {}
+        for start, end, kw in self.matcher.find_all(lowered):
+            by_keyword.setdefault(kw, []).append((start, end))
+
+        starts, ends = [], []       # claimed spans, sorted by start (disjoint)
+        for kw in sorted(by_keyword, key=self._priority.__getitem__):
+            last_end = -1
+            for start, end in by_keyword[kw]:
+                # re.sub: non-overlapping, left to right
+                if start < last_end:
+                    continue
+                # Earlier keywords already replaced this text
+                i = bisect_left(starts, start)
+                if (i < len(starts) and starts[i] < end) or (i > 0 and ends[i - 1] > start):
+                    continue
+                insort(starts, start)
+                ends.insert(i, end)
+                last_end = end
+        return list(zip(starts, ends))
+
+    def redact(self, text: str) -> str:
+        """One pass over text itself (ASCII: lowercasing keeps offsets)."""
+        if not text.isascii():
+            return self.redact_normalized(normalized(text))
+
+        spans = self.spans(text.lower())
+        if not spans:
+            return text
+
+        parts, pos = [], 0
+        for start, end in spans:
+            parts.append(text[pos:start])
+            parts.append(self.replacement)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+    def redact_normalized(self, norm) -> str:
+        """Spans found in norm.text, replaced in norm.original."""
+        if norm.aligned or (not self._spaced and norm.original.isascii()):
+            return self.redact(norm.original)
+        spans = self.spans(norm.text)
+        if not spans:
+            return norm.original
+        return norm.replace_spans([(start, end, self.replacement) for start, end in spans])
+
+
+class WordReplacer:
+    """
+    Equivalent to:
+        for pattern, repl in table: text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
+        " ".join(text.split())
+    for a table of whole-word literals (\\bword\\b) that can't overlap each
+    other, whose replacements no later pattern matches (checked at build time).
+    """
+
+    def __init__(self, table, collapse_whitespace: bool = True):
+        self.table = list(table)
+        self._replacements = {}
+
+        for i, (pattern, repl) in enumerate(self.table):
+            m = _WHOLE_WORD.fullmatch(pattern)
+            if not m:
+                raise ValueError(f"Pattern must be a whole-word literal (\\bword\\b): {pattern!r}")
+            if collapse_whitespace and repl != " ".join(repl.split()):
+                raise ValueError(f"Replacement {repl!r} would be changed by whitespace collapsing")
+            for later, _ in self.table[i + 1:]:
+                if re.search(later, repl, flags=re.IGNORECASE):
+                    raise ValueError(f"Replacement {repl!r} is matched by later pattern {later!r}")
+            self._replacements.setdefault(m.group(1), repl)
+        self._spaced = any(" " in w for w in self._replacements)
+
+        words = list(self._replacements)
+        for w in words:
+            for other in words:
+                if w != other and re.search(rf"\b{w}\b", other):
+                    raise ValueError(f"Overlapping words {w!r} / {other!r} need sequential replacement")
+
+        branches = []
+        if collapse_whitespace:
+            # Only runs that change: longer than one char, not a plain space,
+            # or at either end. Ordinary single spaces never hit the callback.
+            branches.append(r"(?P<ws>\s(?:\s+|\Z)|[^\S ]\s*|\A\s+)")
+        if words:
+            # \b hoisted out of the alternation → one literal-trie test per word start
+            branches.append(r"\b(?:" + "|".join(re.escape(w) for w in words) + r")\b")
+        self._regex = re.compile("|".join(branches), flags=re.IGNORECASE) if branches else None
+        self._words = re.compile(branches[-1], flags=re.IGNORECASE) if words else None
+        self.collapse_whitespace = collapse_whitespace
+
+    def _word(self, matched: str) -> str:
+        repl = self._replacements.get(matched.lower())
+        if repl is None:
+            # IGNORECASE folds a few chars that str.lower() doesn't (e.g. "ſ")
+            repl = next(r for w, r in self._replacements.items() if re.fullmatch(w, matched, flags=re.IGNORECASE))
+        return repl
+
+    def _replace(self, m, end: int):
+        if m.lastgroup == "ws":
+            # split()/join(): runs → one space, nothing at the ends
+            return "" if m.start() == 0 or m.end() == end else " "
+        return self._word(m.group())
+
+    def replace(self, text: str) -> str:
+        if self._regex is None:
+            return text
+        end = len(text)
+        return self._regex.sub(lambda m: self._replace(m, end), text)
+
+    def replace_normalized(self, norm) -> str:
+        """Words found in norm.text, replaced in norm.original (then whitespace collapsed)."""
+        if norm.aligned or (not self._spaced and norm.original.isascii()):
+            # Same words, same boundaries → the one-pass replace()
+            return self.replace(norm.original)
+        text = norm.original
+        if self._words is not None:
+            spans = [(m.start(), m.end(), self._word(m.group())) for m in self._words.finditer(norm.text)]
+            if spans:
+                text = norm.replace_spans(spans)
+        return " ".join(text.split()) if self.collapse_whitespace else text
@@ -4,9 +4,14 @@ Heavy Sanitizer — Intelligent Rewriting
 ✓ Converts unsafe intent → safe educational questions
 ✓ Used only in local mode (cloud uses sanitizer_light)
 ✓ No sklearn/transformers required
+✓ Both tables compiled once → one scan per stage (sanitizer_compiler)
+✓ Tables below are the built-in defaults; a rule pack can replace them
+✓ Matches the shared normalized text, edits the original
 """
 
-import re
+from backend import policy
+from backend.detectors.normalize import normalized
+from backend.detectors.sanitizer_compiler import RewriteTable, WordReplacer
 
 REWRITE_RULES = [
     (r"\bhow to make a bomb\b", 
@@ -49,17 +54,43 @@ GENERIC_REPLACEMENTS = [
 ]
 
 
-def sanitize_prompt(prompt: str) -> str:
-    text = prompt
+# Same semantics as trying REWRITE_RULES in order, then each generic re.sub
+REWRITES = RewriteTable(REWRITE_RULES)
+GENERIC_REPLACER = WordReplacer(GENERIC_REPLACEMENTS)
+
+
+# Rule-pack section (backend/policy.py)
+def default_section() -> dict:
+    return {
+        "rewrites": [list(rule) for rule in REWRITE_RULES],
+        "generic": [list(rule) for rule in GENERIC_REPLACEMENTS],
+    }
+
+
+def _pairs(value, what: str) -> list:
+    if not isinstance(value, list) or not all(
+        isinstance(p, list) and len(p) == 2 and all(isinstance(x, str) for x in p) for p in value
+    ):
+        raise policy.RulePackError(f"{what} must be a list of [regex, replacement] pairs")
+    return [tuple(p) for p in value]
 
-    # 1. Intelligent rewrite if a dangerous phrase is matched
-    for pattern, safe_version in REWRITE_RULES:
-        if re.search(pattern, text, flags=re.IGNORECASE):
-            return safe_version
 
-    # 2. Otherwise, lightly sanitize with generic replacements
-    for pattern, repl in GENERIC_REPLACEMENTS:
-        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
+def compile_section(section: dict) -> dict:
+    return {
+        "rewrites": RewriteTable(_pairs(section["rewrites"], "sanitizer_heavy.rewrites")),
+        "generic": WordReplacer(_pairs(section["generic"], "sanitizer_heavy.generic")),
+    }
+
+
+def sanitize_prompt(prompt) -> str:
+    """prompt: str or NormalizedPrompt."""
+    norm = normalized(prompt)
+    tables = policy.section("sanitizer_heavy")
+
+    # 1. Intelligent rewrite if a dangerous phrase is matched
+    safe_version = tables["rewrites"].first(norm.text, lowered=True)
+    if safe_version is not None:
+        return safe_version
 
-    # 3. Clean spacing
-    return " ".join(text.split())
\ No newline at end of file
+    # 2. Otherwise, lightly sanitize with generic replacements + 3. clean spacing
+    return tables["generic"].replace_normalized(norm)
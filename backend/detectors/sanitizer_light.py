@@ -8,9 +8,14 @@ Lightweight Sanitizer — Cloud Safe
 ✓ No heavy dependencies
 ✓ Preserves user casing & formatting
 ✓ Safe substring replacement (case-insensitive)
+✓ One trie scan + one output join (sanitizer_compiler.KeywordRedactor)
+✓ Keywords below are the built-in defaults; a rule pack can replace them
+✓ Obfuscated spellings ("p​assword", "ｈａｃｋ") found via the normalized text
 """
 
-import re
+from backend import policy
+from backend.detectors.normalize import normalized
+from backend.detectors.sanitizer_compiler import KeywordRedactor
 
 # Keywords to sanitize (case-insensitive)
 DANGEROUS_KEYWORDS = [
@@ -33,17 +38,27 @@ DANGEROUS_KEYWORDS = [
     r"weapon"
 ]
 
+# Keywords are plain literals → one shared multi-pattern scan finds every hit;
+# list order decides overlaps ("self harm" before "harm", "bypass" before
+# "filter bypass") exactly like the old one-re.sub-per-keyword loop.
+REPLACEMENT = "[REMOVED]"
+REDACTOR = KeywordRedactor(DANGEROUS_KEYWORDS, REPLACEMENT)
+DANGEROUS_MATCHER = REDACTOR.matcher
 
-def sanitize_prompt(prompt: str) -> str:
-    """
-    Removes dangerous intent indicators from the prompt
-    while preserving formatting & casing.
-    """
 
-    cleaned = prompt
+# Rule-pack section (backend/policy.py)
+def default_section() -> dict:
+    return {"keywords": list(DANGEROUS_KEYWORDS), "replacement": REPLACEMENT}
+
 
-    for word in DANGEROUS_KEYWORDS:
-        # replace ignoring case, preserve original text structure
-        cleaned = re.sub(word, "[REMOVED]", cleaned, flags=re.IGNORECASE)
+def compile_section(section: dict) -> dict:
+    keywords = policy.strings(section["keywords"], "sanitizer_light.keywords")
+    return {"redactor": KeywordRedactor(keywords, str(section.get("replacement", REPLACEMENT)))}
 
-    return cleaned
+
+def sanitize_prompt(prompt) -> str:
+    """
+    Removes dangerous intent indicators from the prompt (str or
+    NormalizedPrompt) while preserving formatting & casing.
+    """
+    return policy.section("sanitizer_light")["redactor"].redact_normalized(normalized(prompt))
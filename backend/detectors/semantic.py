@@ -1,16 +1,21 @@
 """
 Auto-Switch Semantic Detector
 -----------------------------
-✓ Tries heavy MPNet version first
-✓ If import fails (cloud) → uses lightweight version
+✓ Heavy MPNet version when installed, lightweight version otherwise
+✓ Choice is made once by the engine registry (backend.detectors.engines)
+✓ Importing this module never loads a model
 ✓ Analyzer uses this single interface
 """
 
-try:
-    from backend.detectors.semantic_heavy import check_semantic
-    print("🔵 Using HEAVY semantic model (local MPNet)")
-except Exception as e:
-    from backend.detectors.semantic_light import check_semantic
-    print("🟢 Using LIGHT semantic model (cloud-safe)")
+from backend.detectors import engines
 
-__all__ = ["check_semantic"]
+
+def check_semantic(prompt: str, threshold: float = 0.85) -> dict:
+    return engines.semantic().check_semantic(prompt, threshold)
+
+
+def check_semantic_batch(prompts: list, threshold: float = 0.85) -> list:
+    return engines.semantic().check_semantic_batch(prompts, threshold)
+
+
+__all__ = ["check_semantic", "check_semantic_batch"]
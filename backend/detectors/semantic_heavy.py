@@ -9,21 +9,50 @@ Heavy Semantic Detector — MPNet Edition
 ✓ Keyword fallback
 ✓ Educational override
 ✓ Fully compatible with analyzer + auto-switch
+✓ Concurrent single-prompt calls are micro-batched into one encode
+✓ LRU embedding cache → repeated prompts skip the forward pass
+✓ Lazy model load (first use or background warm-up) — import is instant
+✓ Exemplars pre-normalized into one float32 matrix → single-matmul scoring
+✓ Exemplar matrix memory-mapped from disk (shared by all workers)
+✓ Optional large attack corpus behind an exact / IVF (ANN) index
+✓ Selectable encoder backend: fp32, or dynamically int8-quantized for CPU
+✓ Long prompts scored over overlapping windows (MPNet only sees ~384 tokens)
+✓ Exemplars/keywords below are the built-in defaults; a rule pack can
+  replace them (new exemplars are encoded before the pack is swapped in)
+✓ Encodes the shared normalized text → obfuscated repeats hit the cache
 """
 
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+import importlib
+import json
+import os
+import re
+import threading
+
 import numpy as np
 
+from backend import policy
+from backend.detectors import engines, exemplar_store, metrics
+from backend.detectors.batcher import MicroBatcher
+from backend.detectors.embedding_cache import EmbeddingCache
+from backend.detectors.exemplar_index import IVFIndex, build_index, resolve_kind
+from backend.detectors.keywords import KeywordMatcher
+from backend.detectors.normalize import normalized
+
 # ----------------------------------------------------
-# 1. LOAD STRONGER MODEL (MPNet → fallback MiniLM)
+# 1. STRONGER MODEL (MPNet → fallback MiniLM), loaded lazily
 # ----------------------------------------------------
-try:
-    model = SentenceTransformer("all-mpnet-base-v2")
-    print("🔵 Loaded heavy model: all-mpnet-base-v2")
-except Exception:
-    print("🟡 Heavy model failed — using MiniLM instead")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+PRIMARY_MODEL = "all-mpnet-base-v2"
+FALLBACK_MODEL = "all-MiniLM-L6-v2"
+
+# SEMANTIC_ENCODER_BACKEND: "fp32" (default) | "int8"
+#   int8 = torch dynamic quantization of every nn.Linear (weights int8,
+#   activations quantized on the fly). CPU only; faster and smaller, with a
+#   small score drift — see backend/tests/quantization_drift_report.py
+ENCODER_BACKENDS = ("fp32", "int8")
+ENCODER_BACKEND = os.getenv("SEMANTIC_ENCODER_BACKEND", "fp32").lower()
+
+MODEL_NAME = PRIMARY_MODEL
+model = None
 
 # ----------------------------------------------------
 # 2. MALICIOUS INTENT EMBEDDINGS
@@ -53,9 +82,381 @@ JAILBREAK_BEHAVIOR_PATTERNS = [
     "explain without moral disclaimers",
 ]
 
-# Pre-encode both groups ONCE
-MALICIOUS_VECS = model.encode(KNOWN_MALICIOUS_PROMPTS)
-BEHAVIOR_VECS = model.encode(JAILBREAK_BEHAVIOR_PATTERNS)
+# Both groups are encoded ONCE, together with the model load
+MALICIOUS_VECS = None
+BEHAVIOR_VECS = None
+
+# ----------------------------------------------------
+# 3a. Exemplar matrix — every group stacked, L2-normalized once
+# ----------------------------------------------------
+# Row i of the matrix is labels[i]; slices maps each group to its rows.
+# Prompt scoring is then one (n x dim) @ (dim x E) matmul. Built per rule
+# pack (see _exemplars); the globals mirror the pack loaded with the model.
+EXEMPLAR_GROUPS = {
+    "malicious": KNOWN_MALICIOUS_PROMPTS,
+    "behavior": JAILBREAK_BEHAVIOR_PATTERNS,
+}
+
+EXEMPLAR_MATRIX = None
+EXEMPLAR_LABELS = []
+GROUP_SLICES = {}
+
+_exemplar_lock = threading.Lock()
+
+
+def _l2_normalize(vecs):
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[np.newaxis, :]
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-12)
+
+
+def _build_exemplars(groups: dict, name: str, loaded) -> dict:
+    """{"matrix", "labels", "slices"} for the exemplar groups (mmap store, encoded on a miss)."""
+    matrix, built = exemplar_store.load_or_build(
+        name, groups, lambda texts: _l2_normalize(loaded.encode(texts))
+    )
+    print(f"{'🧮 Encoded' if built else '📦 Memory-mapped'} {len(matrix)} exemplar embeddings")
+
+    labels, slices, start = [], {}, 0
+    for group, texts in groups.items():
+        slices[group] = slice(start, start + len(texts))
+        labels.extend(texts)
+        start += len(texts)
+
+    # plain ndarray view, still backed by the mmap
+    return {"matrix": np.asarray(matrix), "labels": labels, "slices": slices}
+
+
+def _exemplars(tables: dict) -> dict:
+    """Exemplar matrix of a rule-pack section, built on first use if the swap didn't."""
+    ex = tables["exemplars"]
+    if ex is None:
+        loaded = load_model()
+        with _exemplar_lock:
+            ex = tables["exemplars"]
+            if ex is None:
+                ex = tables["exemplars"] = _build_exemplars(tables["groups"], MODEL_NAME, loaded)
+    return ex
+
+
+# ----------------------------------------------------
+# 3c. External attack corpus (optional, 10^4–10^6 prompts)
+# ----------------------------------------------------
+# One prompt per line (.txt) or {"text": ...} per line (.jsonl). Searched
+# through a pluggable index: exact brute force, or IVF ANN for big corpora.
+CORPUS_FILE = os.getenv("EXEMPLAR_CORPUS_FILE")
+CORPUS_INDEX_KIND = os.getenv("EXEMPLAR_INDEX", "auto")            # auto | exact | ivf
+CORPUS_ANN_MIN_ROWS = int(os.getenv("EXEMPLAR_ANN_MIN_ROWS", 20000))
+CORPUS_IVF_LISTS = int(os.getenv("EXEMPLAR_IVF_LISTS", 0))          # 0 → 4·sqrt(n)
+CORPUS_IVF_PROBE = int(os.getenv("EXEMPLAR_IVF_PROBE", 8))
+
+CORPUS_LABELS = []
+CORPUS_INDEX = None
+
+
+def _load_corpus(path: str) -> list:
+    texts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = (json.loads(line).get("text") or "").strip()
+            if line:
+                texts.append(line.lower())
+    return list(dict.fromkeys(texts))
+
+
+def _build_corpus_index(name: str, loaded):
+    global CORPUS_LABELS, CORPUS_INDEX
+
+    texts = _load_corpus(CORPUS_FILE)
+    if not texts:
+        return
+
+    groups = {"corpus": texts}
+    matrix, built = exemplar_store.load_or_build(
+        name, groups, lambda t: _l2_normalize(loaded.encode(t, batch_size=128)), name="corpus"
+    )
+    kind = resolve_kind(CORPUS_INDEX_KIND, len(matrix), CORPUS_ANN_MIN_ROWS)
+    if kind != "ivf":
+        index = build_index(np.asarray(matrix), kind=kind)
+    else:
+        index = _corpus_ivf(name, groups, matrix)
+    print(f"{'🧮 Encoded' if built else '📦 Memory-mapped'} attack corpus → {index.describe()}")
+
+    CORPUS_LABELS = texts
+    CORPUS_INDEX = index
+
+
+def _corpus_ivf(name: str, groups: dict, matrix):
+    """
+    IVF over the corpus with its layout in the exemplar store: the
+    list-ordered vectors are memory-mapped like the matrix itself, so
+    workers share them instead of each holding a private reordered copy.
+    """
+    tag = f"{exemplar_store.texts_hash(groups)}:lists={CORPUS_IVF_LISTS}"
+    layout = exemplar_store.load_arrays(name, tag, "corpus-ivf", IVFIndex.LAYOUT)
+    if layout is None:
+        index = IVFIndex(np.asarray(matrix), n_lists=CORPUS_IVF_LISTS, n_probe=CORPUS_IVF_PROBE)
+        try:
+            exemplar_store.save_arrays(name, tag, "corpus-ivf", index.layout())
+            layout = exemplar_store.load_arrays(name, tag, "corpus-ivf", IVFIndex.LAYOUT)
+        except OSError as e:
+            print("⚠ Exemplar store not writable — keeping the IVF layout in memory:", e)
+        if layout is None:
+            return index
+    return IVFIndex(matrix, n_probe=CORPUS_IVF_PROBE, layout=layout)
+
+
+def _quantize_int8(loaded):
+    """Dynamic int8 quantization of the transformer's Linear layers (in place)."""
+    import torch
+
+    quantization = getattr(torch, "ao", torch).quantization
+    loaded.to("cpu")
+    return quantization.quantize_dynamic(loaded, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def backend_model_name(name: str, backend: str) -> str:
+    """Cache / exemplar-store key: int8 embeddings must never mix with fp32 ones."""
+    return name if backend == "fp32" else f"{name}+{backend}"
+
+
+def load_encoder(backend: str = None):
+    """
+    (model_name, encoder) for the given backend, with the MPNet → MiniLM
+    fallback. Does not touch module state (the drift report loads both).
+    """
+    backend = (backend or ENCODER_BACKEND).lower()
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}' (expected one of {ENCODER_BACKENDS})")
+
+    from sentence_transformers import SentenceTransformer
+
+    try:
+        name = PRIMARY_MODEL
+        loaded = SentenceTransformer(name, device="cpu" if backend == "int8" else None)
+        print("🔵 Loaded heavy model: all-mpnet-base-v2")
+    except Exception:
+        print("🟡 Heavy model failed — using MiniLM instead")
+        name = FALLBACK_MODEL
+        loaded = SentenceTransformer(name, device="cpu" if backend == "int8" else None)
+
+    if backend == "int8":
+        loaded = _quantize_int8(loaded)
+        print("🔢 Encoder quantized → int8 (dynamic, CPU)")
+
+    return backend_model_name(name, backend), loaded
+
+
+_load_lock = threading.Lock()
+_load_error = None
+
+
+def load_model():
+    """
+    Loads the encoder and pre-encodes the exemplars, once per process.
+    Safe to call from many threads; everyone waits for the first load.
+    """
+    global model, MODEL_NAME, MALICIOUS_VECS, BEHAVIOR_VECS
+    global EXEMPLAR_MATRIX, EXEMPLAR_LABELS, GROUP_SLICES, _load_error
+
+    if model is not None:
+        return model
+    if _load_error is not None:
+        raise RuntimeError(_load_error)
+
+    with _load_lock:
+        if model is not None:
+            return model
+        if _load_error is not None:
+            raise RuntimeError(_load_error)
+
+        try:
+            name, loaded = load_encoder()
+
+            # Exemplars of the active rule pack, from the mmap store; encoded
+            # only if texts/model changed
+            tables = policy.section("semantic_heavy")
+            with _exemplar_lock:
+                ex = tables["exemplars"] = _build_exemplars(tables["groups"], name, loaded)
+
+            EXEMPLAR_MATRIX, EXEMPLAR_LABELS, GROUP_SLICES = ex["matrix"], ex["labels"], ex["slices"]
+            MALICIOUS_VECS = EXEMPLAR_MATRIX[GROUP_SLICES["malicious"]] if "malicious" in GROUP_SLICES else None
+            BEHAVIOR_VECS = EXEMPLAR_MATRIX[GROUP_SLICES["behavior"]] if "behavior" in GROUP_SLICES else None
+            if CORPUS_FILE:
+                _build_corpus_index(name, loaded)
+
+            MODEL_NAME = name
+            EMBEDDING_CACHE.model_name = name
+
+            # publish last → other threads never see a half-loaded engine
+            model = loaded
+        except Exception as e:
+            # Remembered once: later calls fail fast, the registry serves light
+            _load_error = f"{type(e).__name__}: {e}"
+            engines.fall_back(_load_error)
+            raise
+
+    return model
+
+
+def _model_encode(texts: list):
+    return load_model().encode(texts)
+
+
+def warm_up():
+    """Load everything and run one forward pass so the first request is fast."""
+    _model_encode(["warm up"])
+
+
+def is_loaded() -> bool:
+    return model is not None
+
+# ----------------------------------------------------
+# 3b. Micro-batching in front of the encoder
+# ----------------------------------------------------
+# Concurrent check_semantic() calls (one per API worker thread) wait up to
+# SEMANTIC_BATCH_WINDOW_MS for each other, then share one forward pass.
+MICROBATCH_ENABLED = os.getenv("SEMANTIC_MICROBATCH", "1") != "0"
+
+ENCODER_BATCHER = MicroBatcher(
+    _model_encode,
+    max_batch_size=int(os.getenv("SEMANTIC_MAX_BATCH", 32)),
+    max_wait_ms=float(os.getenv("SEMANTIC_BATCH_WINDOW_MS", 5)),
+)
+
+
+# Retries, templates and copy-pasted jailbreaks → only novel text pays for MPNet
+EMBEDDING_CACHE = EmbeddingCache(MODEL_NAME, max_mb=float(os.getenv("EMBEDDING_CACHE_MB", 64)))
+
+
+def _encode_one(text: str):
+    """Encode a single prompt → (1, dim) array (cache → micro-batcher → model)."""
+    vec = EMBEDDING_CACHE.get(text)
+    if vec is None:
+        if MICROBATCH_ENABLED:
+            vec = np.array(ENCODER_BATCHER.encode(text))
+        else:
+            vec = _model_encode([text])[0]
+        EMBEDDING_CACHE.put(text, vec)
+    return vec[np.newaxis, :]
+
+
+def _encode_many(texts: list):
+    """Encode a list of prompts → (n, dim) array; only cache misses hit the model."""
+    vecs = [EMBEDDING_CACHE.get(t) for t in texts]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+
+    if missing:
+        fresh = _model_encode([texts[i] for i in missing])
+        for i, row in zip(missing, fresh):
+            # copy → the cache must not pin the whole batch matrix
+            vecs[i] = np.array(row)
+            EMBEDDING_CACHE.put(texts[i], vecs[i])
+
+    return np.vstack(vecs)
+
+
+def encoder_stats() -> dict:
+    stats = ENCODER_BATCHER.stats()
+    stats["enabled"] = MICROBATCH_ENABLED
+    stats["backend"] = ENCODER_BACKEND
+    stats["cache"] = EMBEDDING_CACHE.stats()
+    stats["corpus_index"] = CORPUS_INDEX.describe() if CORPUS_INDEX is not None else None
+    return stats
+
+# ----------------------------------------------------
+# 3d. Long-input mode — sliding windows
+# ----------------------------------------------------
+# The encoder truncates at max_seq_length (384 word-pieces for MPNet), so a
+# jailbreak at the end of a long prompt would never be seen. Prompts longer
+# than one window are split into overlapping word windows; the score is the
+# max over windows, reported with the offending window's character offset.
+#   SEMANTIC_WINDOW_WORDS   words per window (~1.3 word-pieces per word)
+#   SEMANTIC_WINDOW_STRIDE  words between window starts (< size → overlap)
+#   SEMANTIC_MAX_WINDOWS    cap; above it windows are spread evenly over the
+#                           prompt (head and tail always kept)
+#   SEMANTIC_WINDOW_BATCH   windows encoded per pass; stops after the first
+#                           pass with a window over the threshold
+LONG_INPUT_ENABLED = os.getenv("SEMANTIC_LONG_INPUT", "1") != "0"
+WINDOW_WORDS = int(os.getenv("SEMANTIC_WINDOW_WORDS", 200))
+WINDOW_STRIDE = int(os.getenv("SEMANTIC_WINDOW_STRIDE", 150))
+MAX_WINDOWS = int(os.getenv("SEMANTIC_MAX_WINDOWS", 32))
+WINDOW_BATCH = int(os.getenv("SEMANTIC_WINDOW_BATCH", 8))
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def split_windows(text: str, size: int = None, stride: int = None, max_windows: int = None) -> list:
+    """
+    [(start, end)] character spans of overlapping word windows.
+    One span for text that fits in a single window.
+    """
+    size = max(1, size or WINDOW_WORDS)
+    stride = max(1, min(size, stride or WINDOW_STRIDE))
+    max_windows = max(1, max_windows or MAX_WINDOWS)
+
+    words = [m.span() for m in _WORD_RE.finditer(text)]
+    if len(words) <= size:
+        return [(0, len(text))]
+
+    last = len(words) - size
+    starts = list(range(0, last + 1, stride))
+    if starts[-1] != last:
+        starts.append(last)
+
+    if len(starts) > max_windows:
+        # Evenly spaced subset — bounded cost, still covers head and tail
+        step = (len(starts) - 1) / (max_windows - 1) if max_windows > 1 else 0
+        starts = sorted({starts[round(i * step)] for i in range(max_windows)})
+
+    return [(words[i][0], words[i + size - 1][1]) for i in starts]
+
+
+def is_long(text: str) -> bool:
+    """More words than one window (split stops counting after WINDOW_WORDS)."""
+    return len(text.split(None, WINDOW_WORDS)) > WINDOW_WORDS
+
+
+def _check_windows(norm, spans: list, threshold: float) -> dict:
+    """
+    Scores every window of norm.text (in passes of WINDOW_BATCH) → best
+    result + its window, with offsets into the original prompt.
+    """
+    cleaned = norm.text
+    best, best_idx, scanned = None, 0, 0
+
+    for chunk_start in range(0, len(spans), max(1, WINDOW_BATCH)):
+        chunk = spans[chunk_start:chunk_start + WINDOW_BATCH]
+        with metrics.stage("semantic_encode"):
+            vecs = _encode_many([cleaned[a:b] for a, b in chunk])
+        with metrics.stage("semantic_similarity"):
+            scored = _score_vectors(vecs, threshold)
+        scanned += len(chunk)
+
+        for i, r in enumerate(scored):
+            if best is None or r["score"] > best["score"]:
+                best, best_idx = r, chunk_start + i
+
+        # Early exit: the verdict cannot get any safer
+        if not best["safe"]:
+            break
+
+    start, end = norm.span(*spans[best_idx])
+    best["window"] = {
+        "index": best_idx,
+        "start": start,
+        "end": end,
+        "windows": len(spans),
+        "scanned": scanned,
+    }
+    return best
+
 
 # ----------------------------------------------------
 # 4. Keywords fallback
@@ -66,6 +467,8 @@ SEMANTIC_DANGER_KEYWORDS = [
     "illegal", "leak", "override", "exploit",
 ]
 
+SEMANTIC_DANGER_MATCHER = KeywordMatcher(SEMANTIC_DANGER_KEYWORDS)
+
 # ----------------------------------------------------
 # 5. Educational override
 # ----------------------------------------------------
@@ -75,79 +478,236 @@ SAFE_CONTEXT_KEYWORDS = [
     "history", "science", "engineering",
 ]
 
+SAFE_CONTEXT_MATCHER = KeywordMatcher(SAFE_CONTEXT_KEYWORDS)
+
 
 # ----------------------------------------------------
-# MAIN FUNCTION (HEAVY MODE)
+# Rule-pack section (backend/policy.py)
 # ----------------------------------------------------
-def check_semantic(prompt: str, threshold: float = 0.85) -> dict:
-    """
-    Returns:
-      {
-        "safe": bool,
-        "score": float,
-        "matched_prompt": str | None
-      }
-    """
+def default_section() -> dict:
+    return {
+        "exemplars": {group: list(texts) for group, texts in EXEMPLAR_GROUPS.items()},
+        "danger_keywords": list(SEMANTIC_DANGER_KEYWORDS),
+        "safe_context": list(SAFE_CONTEXT_KEYWORDS),
+    }
+
+
+def compile_section(section: dict) -> dict:
+    groups = section["exemplars"]
+    if not isinstance(groups, dict):
+        raise policy.RulePackError("semantic_heavy.exemplars must map group → [texts]")
+    groups = {g: policy.strings(t, f"semantic_heavy.exemplars.{g}") for g, t in groups.items() if t}
+    if not groups:
+        raise policy.RulePackError("semantic_heavy.exemplars needs at least one exemplar")
+
+    def matcher(key):
+        return KeywordMatcher([kw.lower() for kw in policy.strings(section[key], f"semantic_heavy.{key}")])
+
+    return {
+        "groups": groups,
+        "danger": matcher("danger_keywords"),
+        "safe_context": matcher("safe_context"),
+        "exemplars": None,      # filled by prepare_section / on first use
+    }
+
+
+def prepare_section(tables: dict):
+    """Encode a new pack's exemplars before the swap (only once the model is in memory)."""
+    if model is not None:
+        _exemplars(tables)
 
-    cleaned = (prompt or "").strip().lower()
+
+# ----------------------------------------------------
+# Shared steps (single + batch)
+# ----------------------------------------------------
+def _precheck(cleaned: str, threshold: float, tables: dict):
+    """Cheap non-model verdicts. Returns a result dict, or None if the prompt needs encoding."""
 
     # 1) Empty safe
     if not cleaned:
         return {"safe": True, "score": 0.0, "matched_prompt": None}
 
     # 2) Educational override
-    for word in SAFE_CONTEXT_KEYWORDS:
-        if word in cleaned:
-            return {"safe": True, "score": 0.0, "matched_prompt": None}
+    if tables["safe_context"].search(cleaned):
+        return {"safe": True, "score": 0.0, "matched_prompt": None}
 
     # 3) Keyword fallback
-    for kw in SEMANTIC_DANGER_KEYWORDS:
-        if kw in cleaned:
-            return {
-                "safe": False,
-                "score": threshold + 0.01,
-                "matched_prompt": kw,
-            }
+    kw = tables["danger"].first(cleaned)
+    if kw:
+        return {
+            "safe": False,
+            "score": threshold + 0.01,
+            "matched_prompt": kw,
+        }
 
-    # 4) Encode prompt — safe failover
-    try:
-        user_vec = model.encode([cleaned])
-    except Exception:
-        print("⚠ Heavy semantic model failed — returning SAFE fallback")
-        return {"safe": True, "score": 0.0, "matched_prompt": None}
+    return None
+
+
+def score_exemplars(user_vecs, ex: dict = None):
+    """Cosine similarity of each prompt vs every exemplar of the pack → (n_prompts, n_exemplars)."""
+    ex = ex or _exemplars(policy.section("semantic_heavy"))
+    return _l2_normalize(user_vecs) @ ex["matrix"].T
+
+
+def _corpus_best(user_vecs):
+    """Per-prompt (max score, corpus text) from the corpus index."""
+    scores, rows = CORPUS_INDEX.search(_l2_normalize(user_vecs))
+    return [(float(sc), CORPUS_LABELS[int(r)]) for sc, r in zip(scores, rows)]
+
+
+def _group_best(sims, ex: dict, group: str):
+    """Per-prompt (max score, label) inside one exemplar group."""
+    sl = ex["slices"][group]
+    block = sims[:, sl]
+    idx = np.argmax(block, axis=1)
+    scores = block[np.arange(len(idx)), idx]
+    return [(float(sc), ex["labels"][sl.start + int(i)]) for sc, i in zip(scores, idx)]
 
+
+def _score_vectors(user_vecs, threshold: float) -> list:
     # ----------------------------------------------------
-    # 5) Primary malicious match
+    # 5) Primary malicious match + 6) behavioral jailbreak match
+    #    (ONE matmul against the pre-normalized exemplar matrix;
+    #    every group of the pack, in pack order)
     # ----------------------------------------------------
     try:
-        sim_main = cosine_similarity(user_vec, MALICIOUS_VECS)[0]
-        score_main = float(np.max(sim_main))
-        best_main = KNOWN_MALICIOUS_PROMPTS[int(np.argmax(sim_main))]
+        ex = _exemplars(policy.section("semantic_heavy"))
+        sims = score_exemplars(user_vecs, ex)
+        groups = [_group_best(sims, ex, group) for group in ex["slices"]]
     except Exception:
-        score_main = 0.0
-        best_main = None
+        groups = [[(0.0, None)] * len(user_vecs)]
+
+    # 6b) External attack corpus (exact or ANN index)
+    if CORPUS_INDEX is not None:
+        try:
+            groups.append(_corpus_best(user_vecs))
+        except Exception:
+            pass
 
     # ----------------------------------------------------
-    # 6) Behavioral jailbreak match
+    # 7) Final decision (ties → earlier group)
     # ----------------------------------------------------
+    results = []
+    for candidates in zip(*groups):
+        final_score, final_match = candidates[0]
+        for score, match in candidates[1:]:
+            if score > final_score:
+                final_score, final_match = score, match
+
+        safe = final_score < threshold
+
+        results.append({
+            "safe": safe,
+            "score": round(final_score, 3),
+            "matched_prompt": None if safe else final_match,
+        })
+    return results
+
+
+# ----------------------------------------------------
+# MAIN FUNCTION (HEAVY MODE)
+# ----------------------------------------------------
+def _failover(norms: list, threshold: float) -> list:
+    """
+    Encoding failed. The model never loaded → the light engine scores these
+    prompts (the registry has switched to it for later requests too).
+    A loaded model failing mid-request → SAFE fallback.
+    """
+    if _load_error is not None:
+        return importlib.import_module(engines.ENGINES["light"]["semantic"]).check_semantic_batch(norms, threshold)
+    print("⚠ Heavy semantic model failed — returning SAFE fallback")
+    return [{"safe": True, "score": 0.0, "matched_prompt": None} for _ in norms]
+
+
+def check_semantic(prompt, threshold: float = 0.85) -> dict:
+    """
+    prompt: str or NormalizedPrompt. Returns:
+      {
+        "safe": bool,
+        "score": float,
+        "matched_prompt": str | None,
+        "window": {...}        # long prompts only: index/start/end of the best window
+      }
+    """
+
+    norm = normalized(prompt)
+    cleaned = norm.text
+
+    early = _precheck(cleaned, threshold, policy.section("semantic_heavy"))
+    if early is not None:
+        return early
+
+    # 4a) Long prompt → sliding windows
+    if LONG_INPUT_ENABLED and is_long(cleaned):
+        try:
+            return _check_windows(norm, split_windows(cleaned), threshold)
+        except Exception:
+            return _failover([norm], threshold)[0]
+
+    # 4) Encode prompt — safe failover
     try:
-        sim_beh = cosine_similarity(user_vec, BEHAVIOR_VECS)[0]
-        score_beh = float(np.max(sim_beh))
-        best_beh = JAILBREAK_BEHAVIOR_PATTERNS[int(np.argmax(sim_beh))]
+        with metrics.stage("semantic_encode"):
+            user_vec = _encode_one(cleaned)
     except Exception:
-        score_beh = 0.0
-        best_beh = None
+        return _failover([norm], threshold)[0]
 
-    # ----------------------------------------------------
-    # 7) Final decision
-    # ----------------------------------------------------
-    final_score = max(score_main, score_beh)
-    final_match = best_main if score_main >= score_beh else best_beh
+    with metrics.stage("semantic_similarity"):
+        return _score_vectors(user_vec, threshold)[0]
 
-    safe = final_score < threshold
 
-    return {
-        "safe": safe,
-        "score": round(final_score, 3),
-        "matched_prompt": None if safe else final_match,
-    }
+# ----------------------------------------------------
+# Turn embeddings (conversation sessions)
+# ----------------------------------------------------
+def embed(prompt):
+    """L2-normalized embedding of the prompt → (dim,). Served from the embedding cache when seen."""
+    with metrics.stage("semantic_encode"):
+        return _l2_normalize(_encode_one(normalized(prompt).text))[0]
+
+
+def score_embedding(vec, threshold: float = 0.85) -> dict:
+    """check_semantic()-style result for an already computed embedding (e.g. a session sum)."""
+    with metrics.stage("semantic_similarity"):
+        return _score_vectors(np.asarray(vec)[np.newaxis, :], threshold)[0]
+
+
+# ----------------------------------------------------
+# BATCH FUNCTION — one encode + one matrix op per group
+# ----------------------------------------------------
+def check_semantic_batch(prompts: list, threshold: float = 0.85) -> list:
+    """
+    Same result per prompt as check_semantic(), but every prompt that
+    needs the model is encoded in ONE model.encode() call.
+    """
+
+    norms = [normalized(p) for p in prompts]
+    cleaned = [n.text for n in norms]
+    tables = policy.section("semantic_heavy")
+    results = [_precheck(c, threshold, tables) for c in cleaned]
+
+    pending = [i for i, r in enumerate(results) if r is None]
+
+    # Long prompts are windowed one by one; the rest share one encode
+    if LONG_INPUT_ENABLED:
+        short = []
+        for i in pending:
+            if is_long(cleaned[i]):
+                results[i] = check_semantic(norms[i], threshold)
+            else:
+                short.append(i)
+        pending = short
+
+    if not pending:
+        return results
+
+    try:
+        with metrics.stage("semantic_encode"):
+            user_vecs = _encode_many([cleaned[i] for i in pending])
+    except Exception:
+        scored = _failover([norms[i] for i in pending], threshold)
+    else:
+        with metrics.stage("semantic_similarity"):
+            scored = _score_vectors(user_vecs, threshold)
+
+    for i, r in zip(pending, scored):
+        results[i] = r
+    return results
@@ -8,10 +8,15 @@ Lightweight Semantic Detector (Cloud-Safe Version)
 ✓ NO numpy
 ✓ 100% deployable on Railway/Render free tier
 ✓ Compatible with Analyzer's expected return format
+✓ Patterns/whitelist below are the built-in defaults; a rule pack can replace them
 """
 
 import re
 
+from backend import policy
+from backend.detectors.keywords import KeywordMatcher
+from backend.detectors.normalize import normalized
+
 # ---------------------------------------------
 # Lightweight (fake-semantic) danger patterns
 # ---------------------------------------------
@@ -31,24 +36,49 @@ SAFE_CONTEXT_KEYWORDS = [
     "explain", "history", "science", "engineering",
 ]
 
+SAFE_CONTEXT_MATCHER = KeywordMatcher(SAFE_CONTEXT_KEYWORDS)
+
+
+# ---------------------------------------------
+# Rule-pack section (backend/policy.py)
+# ---------------------------------------------
+def default_section() -> dict:
+    return {
+        "patterns": dict(MALICIOUS_SEMANTIC_PATTERNS),
+        "safe_context": list(SAFE_CONTEXT_KEYWORDS),
+    }
+
 
-def check_semantic(prompt: str, threshold: float = 0.85) -> dict:
-    txt = prompt.lower().strip()
+def compile_section(section: dict) -> dict:
+    patterns = section["patterns"]
+    if not isinstance(patterns, dict):
+        raise policy.RulePackError("semantic_light.patterns must map regex → score")
+    return {
+        "patterns": [(re.compile(p), p, float(score)) for p, score in patterns.items()],
+        "safe_context": KeywordMatcher(
+            [kw.lower() for kw in policy.strings(section["safe_context"], "semantic_light.safe_context")]
+        ),
+    }
+
+
+def check_semantic(prompt, threshold: float = 0.85) -> dict:
+    txt = normalized(prompt).text
 
     if not txt:
         return {"safe": True, "score": 0.0, "matched_prompt": None}
 
+    tables = policy.section("semantic_light")
+
     # Educational override
-    for w in SAFE_CONTEXT_KEYWORDS:
-        if w in txt:
-            return {"safe": True, "score": 0.0, "matched_prompt": None}
+    if tables["safe_context"].search(txt):
+        return {"safe": True, "score": 0.0, "matched_prompt": None}
 
     # Simulated semantic-matching using regex scoring
     best_score = 0.0
     best_match = None
 
-    for pattern, score in MALICIOUS_SEMANTIC_PATTERNS.items():
-        if re.search(pattern, txt):
+    for regex, pattern, score in tables["patterns"]:
+        if regex.search(txt):
             if score > best_score:
                 best_score = score
                 best_match = pattern
@@ -61,3 +91,8 @@ def check_semantic(prompt: str, threshold: float = 0.85) -> dict:
         "score": round(best_score, 3),
         "matched_prompt": None if safe else best_match,
     }
+
+
+def check_semantic_batch(prompts: list, threshold: float = 0.85) -> list:
+    # No model → nothing to vectorize; same interface as the heavy engine
+    return [check_semantic(p, threshold) for p in prompts]
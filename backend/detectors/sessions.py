@@ -0,0 +1,280 @@
+# backend/detectors/sessions.py
+
+"""
+Conversation Sessions — incremental multi-turn analysis
+-------------------------------------------------------
+✓ Client sends conversation_id + the NEW turn; only that turn is analyzed
+  (analyze_prompt, verdict cache and all) → linear cost per session,
+  not quadratic like re-sending the whole history
+✓ Per-session state: recent turn texts, a decayed sum of turn embeddings
+  (heavy engine), running max risk, rule hits, blocked-turn count
+✓ Jailbreaks split across turns:
+    - rules (+ light semantic patterns) over the last turns stitched
+      together — a hit that needs the new turn blocks it
+    - heavy: the session embedding (recent turns, older ones decayed)
+      scored against the exemplars — no extra encode, turn vectors come
+      from the embedding cache
+✓ Bounded store: max sessions (LRU) + idle TTL
+✓ Turns of one conversation are analyzed in order (per-session lock)
+✓ The turn that opens a session returns a conversation token; ending the
+  session early needs it, so a leaked conversation id can't wipe the
+  context an attack is being stitched against
+
+State lives in this process. Under the pre-fork server a conversation can
+hit several workers; clients that also send the last few turns as `history`
+get the same cross-turn checks whichever worker answers.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+from backend import policy
+from backend.detectors import analyzer, engines, metrics
+from backend.detectors.normalize import NormalizedPrompt
+
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 1800))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 10000))
+
+# Cross-turn window: this many previous turns, at most this many chars of them
+CONTEXT_TURNS = int(os.getenv("SESSION_CONTEXT_TURNS", 3))
+CONTEXT_CHARS = int(os.getenv("SESSION_CONTEXT_CHARS", 2000))
+
+# Session embedding = turn + DECAY * previous session embedding
+EMBEDDING_DECAY = float(os.getenv("SESSION_EMBEDDING_DECAY", 0.5))
+
+MAX_RULE_HITS = 20
+
+# Conversation tokens = HMAC(key, conversation_id). Drawn at import, i.e. in
+# the pre-fork parent → every worker verifies tokens issued by the others.
+# Set PROMPTGUARD_SESSION_SECRET to keep them valid across restarts / hosts.
+_TOKEN_KEY = os.getenv("PROMPTGUARD_SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+class ConversationState:
+
+    __slots__ = (
+        "conversation_id", "turns", "context", "embedding", "max_risk",
+        "rule_hits", "blocked_turns", "created_at", "updated_at", "lock",
+    )
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.turns = 0
+        self.context = deque(maxlen=max(1, CONTEXT_TURNS))
+        self.embedding = None
+        self.max_risk = 0.0
+        self.rule_hits = deque(maxlen=MAX_RULE_HITS)
+        self.blocked_turns = 0
+        self.created_at = self.updated_at = time.time()
+        self.lock = threading.Lock()
+
+    def describe(self) -> dict:
+        return {
+            "conversation_id": self.conversation_id,
+            "turn": self.turns,
+            "max_risk": round(self.max_risk, 3),
+            "blocked_turns": self.blocked_turns,
+            "rule_hits": list(self.rule_hits),
+        }
+
+
+class SessionStore:
+    """LRU of ConversationState, expired after ttl_seconds without a turn."""
+
+    def __init__(self, ttl_seconds: float = 1800.0, max_entries: int = 10000):
+        self.ttl = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+
+        self._data = OrderedDict()      # conversation_id -> (expires_at, state)
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _sweep(self, now):
+        # Oldest first → stop at the first live one
+        while self._data:
+            cid, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[cid]
+            self.expired += 1
+
+    def get_or_create(self, conversation_id: str) -> ConversationState:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                state = ConversationState(conversation_id)
+                self.created += 1
+            else:
+                state = entry[1]
+            self._data[conversation_id] = (now + self.ttl, state)
+            self._data.move_to_end(conversation_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return state
+
+    def get(self, conversation_id: str):
+        with self._lock:
+            self._sweep(time.monotonic())
+            entry = self._data.get(conversation_id)
+            return entry[1] if entry else None
+
+    def drop(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._data.pop(conversation_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._sweep(time.monotonic())
+            return {
+                "sessions": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "created": self.created,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+SESSIONS = SessionStore(SESSION_TTL_SECONDS, SESSION_MAX_ENTRIES)
+
+
+# ----------------------------------------------------
+# Cross-turn checks
+# ----------------------------------------------------
+def _tail(texts, limit: int) -> str:
+    return "\n".join(texts)[-limit:] if texts else ""
+
+
+def _stitched_hit(context: str, turn: str):
+    """
+    Rule (and light-semantic) hit on context + turn that neither side has
+    alone → the attack was split across turns. Returns a reason dict or None.
+    """
+    if not context:
+        return None
+    stitched = NormalizedPrompt(context + "\n" + turn)
+    before = NormalizedPrompt(context)
+
+    rule = analyzer.check_rules(stitched)
+    if not rule["safe"] and analyzer.check_rules(before)["safe"]:
+        return {"kind": "rules", "category": rule["category"], "pattern": rule["matched_pattern"],
+                "message": rule["message"]}
+
+    engine = engines.semantic()
+    if not hasattr(engine, "embed"):
+        # Light engine = regex patterns → cheap enough to rerun on the window
+        sem = engine.check_semantic(stitched)
+        if not sem["safe"] and engine.check_semantic(before)["safe"]:
+            return {"kind": "semantic", "score": sem["score"], "matched": sem["matched_prompt"]}
+    return None
+
+
+def _session_embedding_hit(state: ConversationState, turn: NormalizedPrompt, turn_score: float):
+    """Heavy engine: fold the turn into the session embedding, score it. → (hit or None, score)."""
+    engine = engines.semantic()
+    if not hasattr(engine, "embed") or not turn:
+        return None, 0.0
+
+    vec = engine.embed(turn)
+    first = state.embedding is None
+    state.embedding = vec if first else vec + EMBEDDING_DECAY * state.embedding
+    if first:
+        return None, 0.0
+
+    sem = engine.score_embedding(state.embedding)
+    score = float(sem["score"])
+    if score >= analyzer.SEMANTIC_THRESHOLD and score > turn_score:
+        return {"kind": "session_embedding", "score": round(score, 3), "matched": sem["matched_prompt"]}, score
+    return None, score
+
+
+# ----------------------------------------------------
+# Public API
+# ----------------------------------------------------
+def analyze_turn(conversation_id: str, turn: str, history: list = None, full_detail: bool = False) -> dict:
+    """
+    analyze_prompt() for the new turn + cross-turn checks against the
+    session. `history` (optional, most recent last) replaces the stored
+    turn texts as context — for clients that already send it.
+    Returns the analysis with a "session" block.
+    """
+    state = SESSIONS.get_or_create(conversation_id)
+    turn_text = (turn or "").strip()
+
+    with state.lock, policy.pinned():
+        result = analyzer.analyze_prompt(turn_text, full_detail, log=False)
+
+        context_turns = list(state.context) if history is None else [h for h in history[-CONTEXT_TURNS:] if h]
+        context = _tail(context_turns, CONTEXT_CHARS)
+
+        cross = None
+        session_score = 0.0
+        if result["final_safe"]:
+            with metrics.stage("session"):
+                norm = NormalizedPrompt(turn_text)
+                cross = _stitched_hit(context, turn_text)
+                hit, session_score = _session_embedding_hit(state, norm, float(result.get("semantic_score", 0.0)))
+                cross = cross or hit
+
+        if cross:
+            result["final_safe"] = False
+            result["reason"] = [r for r in result["reason"] if r != "No violations"]
+            result["reason"].append(f"Cross-turn attack ({cross['kind']}) — split over the last {len(context_turns) + 1} turns")
+            with metrics.stage("sanitizer"):
+                result["sanitized"] = analyzer.sanitize_prompt(turn_text)
+
+        # ---- state update ----
+        state.turns += 1
+        state.updated_at = time.time()
+        if result["final_safe"]:
+            # Blocked turns stay out of the context → they can't taint later turns
+            state.context.append(turn_text[-CONTEXT_CHARS:])
+        state.max_risk = max(state.max_risk, float(result.get("semantic_score", 0.0)), session_score)
+
+        rule = result.get("rule_details") or {}
+        if not rule.get("safe", True):
+            state.rule_hits.append({"turn": state.turns, "category": rule.get("category"),
+                                    "pattern": rule.get("matched_pattern"), "cross_turn": False})
+        if cross and cross["kind"] == "rules":
+            state.rule_hits.append({"turn": state.turns, "category": cross["category"],
+                                    "pattern": cross["pattern"], "cross_turn": True})
+        if not result["final_safe"]:
+            state.blocked_turns += 1
+
+        result["session"] = {**state.describe(), "cross_turn": cross, "context_turns": len(context_turns)}
+        if state.turns == 1:
+            # Only to the caller that opened the session — later turns don't repeat it
+            result["session"]["conversation_token"] = conversation_token(conversation_id)
+
+    extra = {}
+    if cross and cross["kind"] == "rules":
+        extra = {"category": cross["category"], "rule_category": cross["category"]}
+    analyzer.log_result(result, turn_text, source="conversation", conversation_id=conversation_id, **extra)
+    return result
+
+
+def conversation_token(conversation_id: str) -> str:
+    return hmac.new(_TOKEN_KEY, conversation_id.encode(), hashlib.sha256).hexdigest()
+
+
+def check_token(conversation_id: str, token: str) -> bool:
+    return hmac.compare_digest(token or "", conversation_token(conversation_id))
+
+
+def end_session(conversation_id: str) -> bool:
+    return SESSIONS.drop(conversation_id)
@@ -0,0 +1,151 @@
+# backend/detectors/verdict_cache.py
+
+"""
+Verdict Cache
+-------------
+✓ Full analyze_prompt() results, keyed on prompt + config fingerprint
+✓ TTL + max-entries bound (LRU eviction)
+✓ Single-flight: concurrent identical prompts wait for ONE computation
+✓ Thread-safe
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def fingerprint(*parts) -> str:
+    """Stable short hash of anything that changes verdicts (rules, thresholds, engines)."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+class VerdictCache:
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 10000):
+        self.ttl = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+
+        self._data = OrderedDict()      # key -> (expires_at, value)
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(config_fingerprint: str, prompt: str) -> str:
+        h = hashlib.sha1(config_fingerprint.encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    # ----------------------------------------------------
+    # Internal (caller holds the lock)
+    # ----------------------------------------------------
+    def _lookup(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, value, now):
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # ----------------------------------------------------
+    # Public API
+    # ----------------------------------------------------
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value if fresh; otherwise compute() — but only once across
+        threads asking for the same key at the same time.
+        """
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+                return value
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set_exception(e)
+            raise
+
+        with self._lock:
+            self._store(key, value, time.monotonic())
+            self._inflight.pop(key, None)
+        flight.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,110 @@
+"""
+Gemini Upstream Client
+----------------------
+✓ One shared pooled httpx.AsyncClient per process (keep-alive, no TLS per call)
+✓ Configurable connect/read timeouts and connection limits
+✓ Base URL + model overridable (stub servers for local testing)
+✓ streamGenerateContent (SSE) relayed chunk by chunk
+"""
+
+import json
+import os
+
+import httpx
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", 5))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", 60))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", 200))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", 50))
+
+_client = None
+
+
+class GeminiError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def get_client() -> httpx.AsyncClient:
+    """Created lazily inside the running event loop, reused by every request."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=GEMINI_BASE_URL,
+            timeout=httpx.Timeout(
+                connect=GEMINI_CONNECT_TIMEOUT,
+                read=GEMINI_READ_TIMEOUT,
+                write=GEMINI_CONNECT_TIMEOUT,
+                pool=GEMINI_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_MAX_KEEPALIVE,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def build_payload(prompt: str) -> dict:
+    return {"contents": [{"parts": [{"text": prompt}]}]}
+
+
+def extract_text(g: dict, default: str = "⚠ Gemini returned no text.") -> str:
+    return (
+        (g.get("candidates") or [{}])[0]
+         .get("content", {})
+         .get("parts", [{}])[0]
+         .get("text", default)
+    )
+
+
+async def generate_content(prompt: str, api_key: str) -> httpx.Response:
+    return await get_client().post(
+        f"/models/{GEMINI_MODEL}:generateContent",
+        params={"key": api_key},
+        json=build_payload(prompt),
+    )
+
+
+async def stream_generate_content(prompt: str, api_key: str):
+    """
+    Yields text chunks as Gemini produces them (alt=sse).
+    Raises GeminiError if the upstream answers with a non-200 status.
+    """
+    async with get_client().stream(
+        "POST",
+        f"/models/{GEMINI_MODEL}:streamGenerateContent",
+        params={"key": api_key, "alt": "sse"},
+        json=build_payload(prompt),
+    ) as res:
+        if res.status_code != 200:
+            body = await res.aread()
+            raise GeminiError(res.status_code, body.decode("utf-8", "replace"))
+
+        async for line in res.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if not data or data == "[DONE]":
+                continue
+            try:
+                g = json.loads(data)
+            except ValueError:
+                continue
+
+            text = extract_text(g, default="")
+            if text:
+                yield text
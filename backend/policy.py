@@ -1,41 +1,379 @@
-from detectors.rules import check_prompt
-from sanitizer_heavy import sanitize_prompt
-from semantic_heavy import is_semantically_dangerous
+# backend/policy.py
 
-def analyze_prompt(prompt: str):
-    """
-    Full pipeline:
-    1. Rule-based detection (keywords/regex)
-    2. Semantic detection (meaning-based)
-    3. Sanitization if dangerous
-    """
-    # 1️⃣ Rule-based detection (jailbreak, hate speech, self-harm, illegal)
-    is_dangerous, reason, category = check_prompt(prompt)
-    
-    if is_dangerous:
-        sanitized = sanitize_prompt(prompt)
-        return {
-            "safe": False,
-            "category": category,
-            "reason": reason,
-            "sanitized_prompt": sanitized
-        }
+"""
+Rule Packs — hot-reloadable detection policy
+--------------------------------------------
+✓ Rules, whitelists, semantic keywords/exemplars and sanitizer tables
+  loaded from a versioned JSON rule-pack file (RULE_PACK_FILE)
+✓ Sections missing from the file keep the built-in tables (the Python
+  literals in each detector module)
+✓ Compiled OFF the request path (watcher thread / admin endpoint), then
+  published with one reference assignment → atomic swap
+✓ Each request pins the pack it started with (contextvar) → in-flight
+  requests finish on the old version, and every stage sees the same one
+✓ A broken pack never replaces a working one; the error is kept for /rulepack
+✓ Only the selected engines' detector modules are imported (light deploys
+  have no numpy); a pack that can't load at startup → built-in tables
+
+Pack file (every section optional, a section replaces the built-in one whole):
+    {
+      "version": "2026.10.18-1",
+      "rules":           {"safe_context": [...], "categories": [{"category", "message", "patterns"}]},
+      "semantic_light":  {"patterns": {regex: score}, "safe_context": [...]},
+      "semantic_heavy":  {"exemplars": {group: [texts]}, "danger_keywords": [...], "safe_context": [...]},
+      "sanitizer_light": {"keywords": [...], "replacement": "[REMOVED]"},
+      "sanitizer_heavy": {"rewrites": [[regex, text]], "generic": [[regex, text]]}
+    }
+
+    python -m backend.policy export > rulepack.json     # built-in pack as a starting point
+    python -m backend.policy check rulepack.json        # compile every section, no swap
+"""
+
+import contextvars
+import hashlib
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+
+BUILTIN_VERSION = "builtin"
+
+RULE_PACK_FILE = os.getenv("RULE_PACK_FILE") or None
+# Seconds between file checks; 0 → reload only through the admin endpoint
+RULE_PACK_POLL_SECONDS = float(os.getenv("RULE_PACK_POLL_SECONDS", 2))
 
-    # 2️⃣ Semantic detection (detect rephrased hidden attacks)
-    sem_danger, sem_reason = is_semantically_dangerous(prompt)
-    if sem_danger:
-        sanitized = sanitize_prompt(prompt)
+# Section → detector module. Each module provides default_section() (its
+# literals as plain data) and compile_section(section) → compiled tables;
+# optionally prepare_section(tables) for slow work done before the swap.
+SECTIONS = {
+    "rules": "backend.detectors.rules",
+    "semantic_light": "backend.detectors.semantic_light",
+    "semantic_heavy": "backend.detectors.semantic_heavy",
+    "sanitizer_light": "backend.detectors.sanitizer_light",
+    "sanitizer_heavy": "backend.detectors.sanitizer_heavy",
+}
+
+
+class RulePackError(ValueError):
+    """The pack file can't be read or one of its sections doesn't compile."""
+
+
+class RulePack:
+    """One compiled, immutable rule pack. Sections compile only for the engines in use."""
+
+    def __init__(self, version: str, spec: dict, source: str = None, stamp: tuple = None):
+        self.version = version
+        self.spec = spec
+        self.source = source
+        self.stamp = stamp
+        self.loaded_at = time.time()
+        self.digest = hashlib.sha256(
+            json.dumps([version, spec], sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        self._sections = {}
+        self._lock = threading.Lock()
+
+    def section(self, name: str):
+        tables = self._sections.get(name)
+        if tables is None:
+            with self._lock:
+                tables = self._sections.get(name)
+                if tables is None:
+                    # Engine switched after the build → its built-in section
+                    spec = self.spec[name] if name in self.spec else _module(name).default_section()
+                    tables = _compile(name, spec)
+                    self._sections[name] = tables
+        return tables
+
+    def describe(self) -> dict:
         return {
-            "safe": False,
-            "category": "SEMANTIC_ATTACK",
-            "reason": sem_reason,
-            "sanitized_prompt": sanitized
+            "version": self.version,
+            "digest": self.digest[:16],
+            "source": self.source or BUILTIN_VERSION,
+            "loaded_at": round(self.loaded_at, 3),
+            "compiled_sections": sorted(self._sections),
         }
 
-    # ✅ Fully safe prompt
+
+def strings(value, what: str) -> list:
+    """Section helper: value must be a list of strings."""
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise RulePackError(f"{what} must be a list of strings")
+    return list(value)
+
+
+def _module(name: str):
+    return importlib.import_module(SECTIONS[name])
+
+
+def _compile(name: str, section: dict):
+    try:
+        return _module(name).compile_section(section)
+    except RulePackError:
+        raise
+    except Exception as e:
+        raise RulePackError(f"{name}: {type(e).__name__}: {e}") from e
+
+
+def _active_sections() -> list:
+    """rules + the semantic/sanitizer sections of the selected engine."""
+    from backend.detectors import engines
+
+    return ["rules"] + [path.rsplit(".", 1)[1] for path in engines.ENGINES[engines.selected()].values()]
+
+
+def default_spec(sections: list = None) -> dict:
+    """
+    Built-in sections as plain data — default: the ones the selected
+    engines use. The other engine's modules are never imported (heavy
+    needs numpy, which light deploys don't install).
+    """
+    names = _active_sections() if sections is None else sections
+    return {name: _module(name).default_section() for name in names}
+
+
+def _available_sections() -> list:
+    """Sections whose detector module imports here (export / check)."""
+    available = []
+    for name in SECTIONS:
+        try:
+            _module(name)
+        except ImportError as e:
+            print(f"⚠ Skipping section {name}: {e}", file=sys.stderr)
+            continue
+        available.append(name)
+    return available
+
+
+# ----------------------------------------------------
+# Loading + compiling (never on the request path)
+# ----------------------------------------------------
+def read_pack(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulePackError(f"Can't read rule pack {path}: {e}") from e
+
+    if not isinstance(data, dict):
+        raise RulePackError("Rule pack must be a JSON object")
+    version = data.get("version")
+    if not isinstance(version, str) or not version.strip():
+        raise RulePackError("Rule pack needs a non-empty string \"version\"")
+    unknown = sorted(set(data) - set(SECTIONS) - {"version", "description"})
+    if unknown:
+        raise RulePackError(f"Unknown rule pack sections: {unknown}")
+    return data
+
+
+def build_pack(path: str = None, sections: list = None, defaults: list = None) -> RulePack:
+    """
+    Compile a pack (the built-in one if path is None). `sections` are
+    compiled and prepared eagerly — default: the ones the engines use.
+    `defaults`: sections filled from the built-in tables (same default).
+    """
+    spec = default_spec(defaults)
+    version, stamp = BUILTIN_VERSION, None
+    if path:
+        stamp = _file_stamp(path)
+        data = read_pack(path)
+        version = data["version"].strip()
+        for name in SECTIONS:
+            if name in data:
+                spec[name] = data[name]
+
+    pack = RulePack(version, spec, os.path.abspath(path) if path else None, stamp)
+    for name in sections if sections is not None else _active_sections():
+        tables = pack.section(name)
+        prepare = getattr(_module(name), "prepare_section", None)
+        if prepare is not None:
+            try:
+                prepare(tables)
+            except Exception as e:
+                raise RulePackError(f"{name}: {type(e).__name__}: {e}") from e
+    return pack
+
+
+# ----------------------------------------------------
+# Active pack + per-request pinning
+# ----------------------------------------------------
+_active = None
+_swap_lock = threading.Lock()
+_pinned = contextvars.ContextVar("promptguard_rule_pack", default=None)
+
+_state = {
+    "reloads": 0,
+    "last_error": None,
+    "last_checked": None,
+}
+
+
+def active() -> RulePack:
+    """The published pack (loaded on first use)."""
+    global _active
+
+    pack = _active
+    if pack is None:
+        with _swap_lock:
+            if _active is None:
+                try:
+                    _active = build_pack(RULE_PACK_FILE)
+                except Exception as e:
+                    # Bad file (or a section that can't load) at startup →
+                    # serve the built-in tables, report why
+                    _state["last_error"] = str(e) if isinstance(e, RulePackError) else f"{type(e).__name__}: {e}"
+                    print("⚠ Rule pack not loaded — using built-in rules:", e)
+                    _active = build_pack(None)
+                print(f"📜 Rule pack {_active.version} ({_active.digest[:12]})")
+            pack = _active
+    return pack
+
+
+def current() -> RulePack:
+    """The pack pinned for this request, else the published one."""
+    return _pinned.get() or active()
+
+
+def section(name: str):
+    return current().section(name)
+
+
+@contextmanager
+def pinned(pack: RulePack = None):
+    """Every section() inside the block reads the same pack, even across a swap."""
+    pack = pack or current()
+    token = _pinned.set(pack)
+    try:
+        yield pack
+    finally:
+        _pinned.reset(token)
+
+
+def reload(path: str = None, force: bool = False) -> dict:
+    """
+    Compile the pack file, then swap it in. Raises RulePackError and keeps
+    the current pack if it doesn't compile. An identical pack is not swapped
+    unless force=True.
+    """
+    global _active
+
+    path = path or RULE_PACK_FILE
+    try:
+        pack = build_pack(path)
+    except RulePackError as e:
+        _state["last_error"] = str(e)
+        raise
+
+    with _swap_lock:
+        old = _active
+        changed = force or old is None or old.digest != pack.digest
+        if changed:
+            _active = pack
+            _state["reloads"] += 1
+        elif old is not None:
+            old.stamp = pack.stamp
+        _state["last_error"] = None
+
+    if changed:
+        print(f"📜 Rule pack swapped → {pack.version} ({pack.digest[:12]})")
+    return {"changed": changed, **(pack if changed else old).describe()}
+
+
+def status() -> dict:
+    pack = active()
     return {
-        "safe": True,
-        "category": "SAFE",
-        "reason": "No dangerous content detected",
-        "sanitized_prompt": prompt
+        "active": pack.describe(),
+        "file": os.path.abspath(RULE_PACK_FILE) if RULE_PACK_FILE else None,
+        "poll_seconds": RULE_PACK_POLL_SECONDS if RULE_PACK_FILE else 0,
+        **_state,
     }
+
+
+# ----------------------------------------------------
+# File watcher (one per process — threads don't survive fork)
+# ----------------------------------------------------
+_watcher = None
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _watch(path: str, interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        _state["last_checked"] = round(time.time(), 3)
+        stamp = _file_stamp(path)
+        if stamp is None or stamp == active().stamp:
+            continue
+        try:
+            reload(path)
+        except RulePackError as e:
+            print("⚠ Rule pack reload failed — keeping", active().version, "→", e)
+            # Don't retry the same broken file every tick
+            active().stamp = stamp
+
+
+def start_watcher(path: str = None, interval: float = None):
+    """Polls the pack file and reloads on change. No-op without a file or with interval 0."""
+    global _watcher
+
+    path = path or RULE_PACK_FILE
+    interval = RULE_PACK_POLL_SECONDS if interval is None else interval
+    if not path or interval <= 0 or _watcher is not None:
+        return None
+
+    active()
+    stop = threading.Event()
+    thread = threading.Thread(target=_watch, args=(path, interval, stop), name="rulepack-watcher", daemon=True)
+    thread.start()
+    _watcher = (thread, stop)
+    return thread
+
+
+def stop_watcher():
+    global _watcher
+
+    if _watcher is not None:
+        _watcher[1].set()
+        _watcher = None
+
+
+# ----------------------------------------------------
+# CLI
+# ----------------------------------------------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["export"]:
+        # Detector modules print banners on import → keep stdout pure JSON
+        with redirect_stdout(sys.stderr):
+            spec = default_spec(_available_sections())
+        json.dump({"version": "1", **spec}, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return 0
+    if argv[:1] == ["check"] and len(argv) == 2:
+        try:
+            # Every section that imports here, not just the selected
+            # engines'; no exemplar encode
+            names = _available_sections()
+            pack = build_pack(argv[1], sections=[], defaults=names)
+            for name in names:
+                pack.section(name)
+        except RulePackError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        print(f"✅ {argv[1]}: version {pack.version} ({pack.digest[:12]}) — {len(names)} sections compile")
+        return 0
+
+    print("usage: python -m backend.policy export | check <pack.json>", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
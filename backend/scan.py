@@ -0,0 +1,470 @@
+"""
+PromptGuard Bulk Scan
+---------------------
+✓ Re-scores large prompt dumps offline (exported chat logs, rule-pack
+  validation) — no HTTP, no Gemini, nothing written to the audit log
+✓ Streams JSONL or CSV in and JSONL verdicts out, in input order, without
+  holding the file in memory
+✓ Process pool: the parent loads the engines ONCE and forked workers share
+  them copy-on-write (as in backend.server); each chunk goes through
+  analyze_batch() → one semantic encode per chunk
+✓ Resumable: after completed chunks a checkpoint records the input byte
+  offset and the output size; --resume continues a killed run from there
+✓ Progress + throughput on stderr
+
+    python -m backend.scan chats.jsonl -o verdicts.jsonl --workers 8
+    python -m backend.scan export.csv --field message --id-field msg_id -o out.jsonl --resume
+    python -m backend.scan chats.jsonl -o out.jsonl --rule-pack candidate.json
+
+Input: JSONL (one object per line with the prompt in --field; bare JSON
+strings work too) or CSV with a header row. One output line per record:
+    {"index": n, "id": ..., "safe": bool, "analysis": {...}}
+    {"index": n, "id": ..., "error": "..."}        (unreadable record)
+
+Env: SCAN_CHUNK_SIZE (256), SCAN_CHECKPOINT_SECONDS (5), SCAN_PROGRESS_SECONDS (5).
+"""
+
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", 256))
+CHECKPOINT_SECONDS = float(os.getenv("SCAN_CHECKPOINT_SECONDS", 5))
+PROGRESS_SECONDS = float(os.getenv("SCAN_PROGRESS_SECONDS", 5))
+
+# Chunks queued per worker → workers never wait, memory stays bounded
+INFLIGHT_PER_WORKER = 2
+
+# Settings a resumed run must share with the checkpoint
+_RESUME_KEYS = ("format", "field", "id_field", "engine", "full_detail", "rule_pack_digest")
+
+
+class ScanError(ValueError):
+    """Bad input, options or checkpoint."""
+
+
+# -------------------------------------------------------------
+# Input (byte offsets tracked for checkpoints)
+# -------------------------------------------------------------
+class _Lines:
+    """Decoded lines of a binary file; .offset = byte offset after the last line handed out."""
+
+    def __init__(self, f, offset: int = 0):
+        self.f = f
+        self.offset = offset
+
+    def __iter__(self):
+        for raw in self.f:
+            line = raw.decode("utf-8", errors="replace")
+            if self.offset == 0 and line.startswith("\ufeff"):
+                line = line[1:]
+            self.offset += len(raw)
+            yield line
+
+
+def detect_format(path: str, fmt: str = "auto") -> str:
+    if fmt != "auto":
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _csv_header(rows) -> list:
+    header = next(rows, None)
+    if not header:
+        raise ScanError("CSV input has no header row")
+    return [h.strip() for h in header]
+
+
+def _jsonl_records(lines, field: str, id_field: str):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield None, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(obj, str):
+            yield None, obj, None
+            continue
+        if not isinstance(obj, dict):
+            yield None, None, "record is not an object or a string"
+            continue
+        rid = obj.get(id_field) if id_field else None
+        prompt = obj.get(field)
+        if not isinstance(prompt, str):
+            yield rid, None, f"missing or non-string field {field!r}"
+            continue
+        yield rid, prompt, None
+
+
+def _csv_records(rows, header: list, field: str, id_field: str):
+    col = header.index(field)
+    id_col = header.index(id_field) if id_field else None
+    for row in rows:
+        if not row:
+            continue
+        rid = row[id_col] if id_col is not None and id_col < len(row) else None
+        if col >= len(row):
+            yield rid, None, f"row has no column {field!r}"
+            continue
+        yield rid, row[col], None
+
+
+def read_records(f, fmt: str, field: str, id_field: str = None, offset: int = 0, index: int = 0):
+    """
+    Yields (index, offset_after, id, prompt, error) from byte `offset` on.
+    f is a binary file (seekable unless offset is 0).
+    """
+    header = None
+    if offset:
+        if fmt == "csv":
+            f.seek(0)
+            header = _csv_header(csv.reader(_Lines(f)))
+        f.seek(offset)
+    lines = _Lines(f, offset)
+
+    if fmt == "csv":
+        rows = csv.reader(lines)
+        header = header or _csv_header(rows)
+        for name in filter(None, (field, id_field)):
+            if name not in header:
+                raise ScanError(f"CSV column {name!r} not found (columns: {header})")
+        records = _csv_records(rows, header, field, id_field)
+    else:
+        records = _jsonl_records(lines, field, id_field)
+
+    for rid, prompt, error in records:
+        yield index, lines.offset, rid, prompt, error
+        index += 1
+
+
+def chunked(records, size: int):
+    """[(index, id, prompt, error)] chunks + the byte offset after each chunk."""
+    chunk, offset = [], 0
+    for index, offset, rid, prompt, error in records:
+        chunk.append((index, rid, prompt, error))
+        if len(chunk) >= size:
+            yield chunk, offset
+            chunk = []
+    if chunk:
+        yield chunk, offset
+
+
+# -------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------
+def _init_worker(engine: str, rule_pack: str, torch_threads: int, load: bool):
+    # Ctrl-C is handled by the parent (it writes the checkpoint)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if load:
+        # spawn start method → nothing inherited, load here
+        _load_engines(engine, rule_pack)
+    if "torch" in sys.modules and torch_threads:
+        # N workers × all cores would oversubscribe the CPU
+        sys.modules["torch"].set_num_threads(torch_threads)
+
+
+def scan_chunk(chunk: list, full_detail: bool = False):
+    """Analyze one chunk → (JSONL text, (scanned, blocked, errors)). Runs in the worker."""
+    from backend.detectors.analyzer import analyze_batch
+
+    prompts = [prompt for _, _, prompt, error in chunk if error is None]
+    results = iter(analyze_batch(prompts, full_detail, log=False) if prompts else [])
+
+    lines, blocked, errors = [], 0, 0
+    for index, rid, _, error in chunk:
+        record = {"index": index}
+        if rid is not None:
+            record["id"] = rid
+        if error is not None:
+            record["error"] = error
+            errors += 1
+        else:
+            result = next(results)
+            record["safe"] = result["final_safe"]
+            record["analysis"] = result
+            blocked += not result["final_safe"]
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return "\n".join(lines) + "\n", (len(chunk), blocked, errors)
+
+
+def _load_engines(engine: str, rule_pack: str = None):
+    from backend import policy
+    from backend.detectors import analyzer, engines  # noqa: F401  (imported before the fork → shared)
+
+    engines.select(engine)
+    if rule_pack:
+        # Raises RulePackError → a broken candidate pack fails the scan
+        policy.reload(rule_pack)
+    # Forward pass is left to the workers (no fork after a threaded OpenMP region)
+    engines.warm_up(forward=False)
+    status = engines.status()
+    if status["error"]:
+        raise ScanError(f"Engine load failed: {status['error']}")
+    return policy.active(), status["engine"]
+
+
+# -------------------------------------------------------------
+# Checkpoints
+# -------------------------------------------------------------
+def checkpoint_path(output: str) -> str:
+    return output + ".ckpt"
+
+
+def read_checkpoint(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise ScanError(f"Can't read checkpoint {path}: {e}") from e
+
+
+def write_checkpoint(path: str, state: dict):
+    # tmp + rename → a crash mid-write leaves the previous checkpoint intact
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------------------
+# Progress
+# -------------------------------------------------------------
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+class Progress:
+
+    def __init__(self, state: dict, input_size: int = None, quiet: bool = False):
+        self.state = state
+        self.input_size = input_size
+        self.quiet = quiet
+        self.start = time.monotonic()
+        self.start_offset = state["offset"]
+        self.start_scanned = state["scanned"]
+        self._last = self.start
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return (self.state["scanned"] - self.start_scanned) / elapsed if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        s = self.state
+        parts = [
+            f"{s['scanned']:,} scanned",
+            f"{self.rate():,.0f}/s",
+            f"{100 * s['blocked'] / max(1, s['scanned'] - s['errors']):.1f}% blocked",
+            f"{s['errors']:,} errors",
+        ]
+        if self.input_size:
+            done = s["offset"] / self.input_size
+            parts.append(f"{100 * done:.1f}% of input")
+            read = s["offset"] - self.start_offset
+            if read > 0 and done < 1:
+                elapsed = time.monotonic() - self.start
+                parts.append("ETA " + _duration(elapsed * (self.input_size - s["offset"]) / read))
+        return " | ".join(parts)
+
+    def tick(self):
+        now = time.monotonic()
+        if not self.quiet and now - self._last >= PROGRESS_SECONDS:
+            self._last = now
+            print("⏳ " + self.line(), file=sys.stderr, flush=True)
+
+
+# -------------------------------------------------------------
+# Scan
+# -------------------------------------------------------------
+def scan(args, stdout=None) -> int:
+    from backend import policy
+
+    if args.input == "-" and args.resume:
+        raise ScanError("--resume needs a file input (stdin can't be re-read)")
+    if args.output == "-" and (args.resume or args.checkpoint):
+        raise ScanError("Checkpoints need --output FILE")
+
+    fmt = detect_format(args.input, args.format)
+    ckpt = args.checkpoint or (checkpoint_path(args.output) if args.output != "-" else None)
+
+    try:
+        pack, engine = _load_engines(args.engine, args.rule_pack)
+    except policy.RulePackError as e:
+        raise ScanError(f"Rule pack rejected: {e}") from e
+
+    state = {
+        "input": os.path.abspath(args.input) if args.input != "-" else "-",
+        "output": os.path.abspath(args.output) if args.output != "-" else "-",
+        "format": fmt,
+        "field": args.field,
+        "id_field": args.id_field,
+        "engine": engine,
+        "full_detail": args.full_detail,
+        "rule_pack": pack.version,
+        "rule_pack_digest": pack.digest,
+        "offset": 0,
+        "next_index": 0,
+        "output_bytes": 0,
+        "scanned": 0,
+        "blocked": 0,
+        "errors": 0,
+        "complete": False,
+    }
+
+    previous = read_checkpoint(ckpt) if args.resume and ckpt else None
+    if previous:
+        changed = [k for k in _RESUME_KEYS if previous.get(k) != state[k]]
+        if previous.get("input") != state["input"]:
+            changed.insert(0, "input")
+        if changed:
+            raise ScanError(f"Checkpoint {ckpt} was written with different {', '.join(changed)} — rerun without --resume")
+        if previous.get("complete"):
+            print(f"✅ {args.output} is already complete ({previous['scanned']:,} prompts)", file=sys.stderr)
+            return 0
+        for key in ("offset", "next_index", "output_bytes", "scanned", "blocked", "errors"):
+            state[key] = previous[key]
+
+    stdout = stdout or sys.stdout.buffer
+    infile = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    input_size = os.fstat(infile.fileno()).st_size if args.input != "-" else None
+
+    if args.output == "-":
+        out = stdout
+    elif previous:
+        # Drop whatever a killed run wrote after its last checkpoint
+        out = open(args.output, "r+b")
+        out.truncate(state["output_bytes"])
+        out.seek(state["output_bytes"])
+        print(f"↩ Resuming at record {state['next_index']:,} (byte {state['offset']:,})", file=sys.stderr)
+    else:
+        out = open(args.output, "wb")
+
+    progress = Progress(state, input_size, args.quiet)
+    workers = max(1, args.workers)
+    pool = None
+    if workers > 1:
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        if start_method == "fork":
+            # Same as the pre-fork server: later GC passes in the workers
+            # don't touch (and copy) the shared model pages
+            gc.collect()
+            gc.freeze()
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(args.engine, args.rule_pack, torch_threads, start_method != "fork"),
+        )
+
+    last_checkpoint = time.monotonic()
+
+    def save(complete: bool = False):
+        out.flush()
+        if ckpt:
+            os.fsync(out.fileno())
+            state["output_bytes"] = out.tell()
+            state["complete"] = complete
+            state["updated_at"] = round(time.time(), 3)
+            write_checkpoint(ckpt, state)
+
+    def finish(chunk_end: int, last_index: int, result):
+        nonlocal last_checkpoint
+        text, (scanned, blocked, errors) = result
+        out.write(text.encode("utf-8"))
+        state["offset"] = chunk_end
+        state["next_index"] = last_index + 1
+        state["scanned"] += scanned
+        state["blocked"] += blocked
+        state["errors"] += errors
+        if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+            save()
+            last_checkpoint = time.monotonic()
+        progress.tick()
+
+    records = read_records(infile, fmt, args.field, args.id_field, state["offset"], state["next_index"])
+    pending = deque()      # (chunk_end, last_index, future) in input order
+    try:
+        for chunk, chunk_end in chunked(records, args.chunk_size):
+            if pool is None:
+                finish(chunk_end, chunk[-1][0], scan_chunk(chunk, args.full_detail))
+                continue
+            pending.append((chunk_end, chunk[-1][0], pool.submit(scan_chunk, chunk, args.full_detail)))
+            # Results are written in order; wait for the oldest once the window is full
+            while len(pending) >= workers * INFLIGHT_PER_WORKER:
+                chunk_end, last_index, future = pending.popleft()
+                finish(chunk_end, last_index, future.result())
+        while pending:
+            chunk_end, last_index, future = pending.popleft()
+            finish(chunk_end, last_index, future.result())
+        save(complete=True)
+    except KeyboardInterrupt:
+        save()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        hint = f" — continue with --resume ({ckpt})" if ckpt else ""
+        print(f"\n⏸ Interrupted after {state['scanned']:,} prompts{hint}", file=sys.stderr)
+        return 130
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if infile is not sys.stdin.buffer:
+            infile.close()
+        if out is not stdout:
+            out.close()
+
+    if not args.quiet:
+        elapsed = time.monotonic() - progress.start
+        print(f"✅ Scan complete in {_duration(elapsed)}: " + progress.line(), file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="PromptGuard offline bulk scan")
+    ap.add_argument("input", help="JSONL or CSV file ('-' for stdin)")
+    ap.add_argument("-o", "--output", default="-", help="JSONL verdicts (default: stdout)")
+    ap.add_argument("--format", choices=("auto", "jsonl", "csv"), default="auto")
+    ap.add_argument("--field", default="prompt", help="JSON key / CSV column holding the prompt")
+    ap.add_argument("--id-field", default=None, help="JSON key / CSV column copied to the output as id")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (1 → no pool)")
+    ap.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="prompts per analyze_batch() call")
+    ap.add_argument("--engine", default=os.getenv("PROMPTGUARD_ENGINE") or "auto", help="heavy | light | auto")
+    ap.add_argument("--rule-pack", default=None, help="score with this rule pack instead of RULE_PACK_FILE")
+    ap.add_argument("--full-detail", action="store_true", help="run every stage (no early verdict)")
+    ap.add_argument("--checkpoint", default=None, help="checkpoint file (default: OUTPUT.ckpt)")
+    ap.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    ap.add_argument("--quiet", action="store_true", help="no progress output")
+    args = ap.parse_args(argv)
+    args.chunk_size = max(1, args.chunk_size)
+
+    # Banners and progress go to stderr → stdout carries only the verdicts
+    stdout = sys.stdout.buffer
+    try:
+        with redirect_stdout(sys.stderr):
+            return scan(args, stdout)
+    except ScanError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,493 @@
+"""
+PromptGuard Pre-fork Server
+---------------------------
+✓ Parent loads everything ONCE: engine selection, compiled rules/keyword
+  tries, the encoder and the (memory-mapped) exemplar matrix
+✓ gc.freeze() → the cyclic GC never writes to those objects, so forked
+  workers keep sharing the pages copy-on-write
+✓ N uvicorn workers share one listening socket
+✓ Per-worker health: each worker's event loop writes a heartbeat
+  (pid, uptime, requests, RSS / PSS / private memory); hung or crashed
+  workers are replaced
+✓ Signals (gunicorn conventions):
+    SIGTERM / SIGINT  graceful shutdown (in-flight requests finish)
+    SIGHUP            rolling restart — one worker at a time, new before old
+    SIGTTIN / SIGTTOU one worker more / fewer
+✓ Crashed workers respawn with exponential backoff; a worker that keeps
+  dying right after start (crash loop) stops the server instead of
+  fork-looping the host
+
+    python -m backend.server --workers 4 --port 9000
+
+Env: PROMPTGUARD_WORKERS (default: min(2, CPUs of this container — cgroup
+     quota / affinity, not the host's core count)), PORT, HOST,
+     PROMPTGUARD_GRACEFUL_TIMEOUT (30 s), PROMPTGUARD_HEARTBEAT_SECONDS (2 s),
+     PROMPTGUARD_WORKER_TIMEOUT (30 s), PROMPTGUARD_TORCH_THREADS
+     (per worker, default CPUs / workers), PROMPTGUARD_RESPAWN_BACKOFF_MAX
+     (60 s), PROMPTGUARD_CRASH_LOOP_LIMIT (5 quick crashes in a row).
+
+Build the exemplar store before deploy (python -m backend.detectors.exemplar_store)
+so the parent never runs the encoder before forking.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import resource
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+HEARTBEAT_SECONDS = float(os.getenv("PROMPTGUARD_HEARTBEAT_SECONDS", 2))
+WORKER_TIMEOUT = float(os.getenv("PROMPTGUARD_WORKER_TIMEOUT", 30))
+GRACEFUL_TIMEOUT = float(os.getenv("PROMPTGUARD_GRACEFUL_TIMEOUT", 30))
+
+# Set by the parent; also tells the API it runs behind the pre-fork server
+WORKER_DIR_ENV = "PROMPTGUARD_WORKER_DIR"
+
+# Each worker can end up with its own copy of the heavy model (~0.5-1 GB)
+# → keep the default small; scale up explicitly with --workers / SIGTTIN
+DEFAULT_MAX_WORKERS = 2
+
+# Respawn: 1 s, 2 s, 4 s ... up to the max after crashes in a row; a worker
+# alive for CRASH_RESET_SECONDS resets the count
+RESPAWN_BACKOFF_BASE = 1.0
+RESPAWN_BACKOFF_MAX = float(os.getenv("PROMPTGUARD_RESPAWN_BACKOFF_MAX", 60))
+CRASH_RESET_SECONDS = 60.0
+CRASH_LOOP_LIMIT = int(os.getenv("PROMPTGUARD_CRASH_LOOP_LIMIT", 5))
+
+
+# -------------------------------------------------------------
+# CPUs actually available (containers: cgroup quota, not host cores)
+# -------------------------------------------------------------
+def _cgroup_cpu_quota():
+    """CPU quota of this cgroup in cores (v2 cpu.max or v1 cfs), None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def default_workers() -> int:
+    env = os.getenv("PROMPTGUARD_WORKERS")
+    if env:
+        return int(env)
+    return min(DEFAULT_MAX_WORKERS, available_cpus())
+
+
+# -------------------------------------------------------------
+# Memory snapshot (Linux: smaps_rollup → shared vs private pages)
+# -------------------------------------------------------------
+_SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+
+def memory_snapshot(pid: int = None) -> dict:
+    """
+    Memory of one process in MB. PSS splits shared pages between the
+    processes mapping them; private_dirty is what COW actually copied.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        out = {}
+        with open(path, "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    out[_SMAPS_FIELDS[key]] = round(int(rest.split()[0]) / 1024, 1)
+        return out
+    except OSError:
+        # Not Linux — peak RSS of this process only
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"peak_rss_mb": round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)}
+
+
+# -------------------------------------------------------------
+# Heartbeat files (one per worker pid)
+# -------------------------------------------------------------
+def _status_path(worker_dir: str, pid: int) -> str:
+    return os.path.join(worker_dir, f"worker-{pid}.json")
+
+
+def write_status(worker_dir: str, status: dict):
+    path = _status_path(worker_dir, status["pid"])
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp, path)
+
+
+def read_status(worker_dir: str = None) -> list:
+    """Every worker's last heartbeat, with a `healthy` flag."""
+    worker_dir = worker_dir or os.getenv(WORKER_DIR_ENV)
+    if not worker_dir or not os.path.isdir(worker_dir):
+        return []
+
+    now = time.time()
+    workers = []
+    for name in sorted(os.listdir(worker_dir)):
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(worker_dir, name), "r", encoding="utf-8") as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        status["heartbeat_age_seconds"] = round(now - status["heartbeat_at"], 2)
+        status["healthy"] = status["heartbeat_age_seconds"] < WORKER_TIMEOUT
+        workers.append(status)
+    return sorted(workers, key=lambda w: (w["index"], w["started_at"]))
+
+
+# -------------------------------------------------------------
+# Worker (runs in the forked child)
+# -------------------------------------------------------------
+def _request_count() -> int:
+    from backend.detectors import metrics
+
+    total = 0
+    for line in metrics.REQUEST_SECONDS.render():
+        if line.startswith(metrics.REQUEST_SECONDS.name + "_count"):
+            total += int(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def _heartbeat(worker_dir: str, index: int, started_at: float):
+    # Runs ON the worker's event loop → a blocked loop stops the heartbeat
+    from backend.detectors import engines
+
+    while True:
+        try:
+            write_status(worker_dir, {
+                "index": index,
+                "pid": os.getpid(),
+                "started_at": started_at,
+                "heartbeat_at": time.time(),
+                "ready": engines.status()["ready"],
+                "requests": _request_count(),
+                "memory": memory_snapshot(),
+            })
+        except Exception as e:
+            print(f"⚠ Worker {index} heartbeat failed:", e)
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+
+
+def run_worker(app, sock, index: int, worker_dir: str, torch_threads: int) -> int:
+    import uvicorn
+
+    # Parent's handlers must not fire in the child; uvicorn installs its own
+    # for TERM/INT. HUP/TTIN/TTOU sent to the whole process group are meant
+    # for the arbiter only.
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(sig, signal.SIG_IGN)
+
+    if "torch" in sys.modules and torch_threads:
+        # N workers × all cores would oversubscribe the CPU
+        sys.modules["torch"].set_num_threads(torch_threads)
+
+    started_at = time.time()
+    config = uvicorn.Config(
+        app,
+        log_level=os.getenv("UVICORN_LOG_LEVEL", "warning"),
+        timeout_graceful_shutdown=int(GRACEFUL_TIMEOUT),
+    )
+    server = uvicorn.Server(config)
+
+    async def serve():
+        beat = asyncio.get_running_loop().create_task(_heartbeat(worker_dir, index, started_at))
+        try:
+            await server.serve(sockets=[sock])
+        finally:
+            beat.cancel()
+
+    asyncio.run(serve())
+    return 0
+
+
+# -------------------------------------------------------------
+# Arbiter (parent)
+# -------------------------------------------------------------
+class Arbiter:
+
+    def __init__(self, app, sock, workers: int, worker_dir: str, torch_threads: int):
+        self.app = app
+        self.sock = sock
+        self.num_workers = max(1, workers)
+        self.worker_dir = worker_dir
+        self.torch_threads = torch_threads
+
+        self.workers = {}           # pid -> {"index", "spawned_at"}
+        self._signals = []
+        self._reported = False
+
+        self._retiring = set()      # pids we asked to stop → not crashes
+        self._crashes = {}          # index -> quick crashes in a row
+        self._respawn_at = {}       # index -> earliest respawn time
+        self.crash_loop = False
+
+    # ---- signals: handlers only queue, the main loop acts ----
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _install_signals(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._on_signal)
+
+    # ---- workers ----
+    def spawn(self, index: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(self.app, self.sock, index, self.worker_dir, self.torch_threads)
+            except BaseException as e:
+                print(f"⚠ Worker {index} crashed:", e)
+            finally:
+                os._exit(code)
+
+        self.workers[pid] = {"index": index, "spawned_at": time.time()}
+        print(f"👷 Worker {index} started (pid {pid})")
+        return pid
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            try:
+                os.remove(_status_path(self.worker_dir, pid))
+            except OSError:
+                pass
+            if worker is not None:
+                print(f"👷 Worker {worker['index']} exited (pid {pid}, status {status})")
+                if pid in self._retiring:
+                    self._retiring.discard(pid)
+                else:
+                    self._crashed(worker)
+
+    def _crashed(self, worker: dict):
+        index = worker["index"]
+        if time.time() - worker["spawned_at"] >= CRASH_RESET_SECONDS:
+            self._crashes[index] = 0
+        crashes = self._crashes.get(index, 0) + 1
+        self._crashes[index] = crashes
+        if crashes >= CRASH_LOOP_LIMIT:
+            print(f"❌ Worker {index} crashed {crashes} times in a row right after start — giving up")
+            self.crash_loop = True
+            return
+        delay = min(RESPAWN_BACKOFF_MAX, RESPAWN_BACKOFF_BASE * 2 ** (crashes - 1))
+        self._respawn_at[index] = time.time() + delay
+        print(f"⏳ Respawning worker {index} in {delay:.0f}s (crash {crashes}/{CRASH_LOOP_LIMIT})")
+
+    def _kill_stale(self):
+        now = time.time()
+        beats = {w["pid"]: w for w in read_status(self.worker_dir)}
+        for pid, worker in list(self.workers.items()):
+            beat = beats.get(pid)
+            last = beat["heartbeat_at"] if beat else worker["spawned_at"]
+            if now - last > WORKER_TIMEOUT:
+                print(f"⚠ Worker {worker['index']} (pid {pid}) missed heartbeats for {now - last:.0f}s — killing")
+                self._signal(pid, signal.SIGKILL)
+
+    def _fill(self):
+        covered = {w["index"] for w in self.workers.values()}
+        now = time.time()
+        for index in range(self.num_workers):
+            if index not in covered and self._respawn_at.get(index, 0) <= now:
+                self.spawn(index)
+        # SIGTTOU: retire the highest indexes
+        for pid, worker in list(self.workers.items()):
+            if worker["index"] >= self.num_workers:
+                self._retire(pid)
+
+    def _retire(self, pid: int):
+        self._retiring.add(pid)
+        self._signal(pid, signal.SIGTERM)
+
+    def _signal(self, pid: int, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _wait_ready(self, pid: int, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self._reap()
+            if pid not in self.workers:
+                return False
+            if any(w["pid"] == pid and w.get("ready") for w in read_status(self.worker_dir)):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def rolling_restart(self):
+        """New worker up and ready before its predecessor is asked to stop."""
+        print("🔄 Rolling restart")
+        for old_pid, worker in sorted(self.workers.items(), key=lambda kv: kv[1]["index"]):
+            new_pid = self.spawn(worker["index"])
+            if not self._wait_ready(new_pid, WORKER_TIMEOUT):
+                print(f"⚠ Replacement for worker {worker['index']} not ready — keeping the old one")
+                self._retire(new_pid)
+                continue
+            self._retire(old_pid)
+
+    def report_memory(self, parent_memory: dict):
+        """Once every worker is up: parent after load vs each worker."""
+        status = read_status(self.worker_dir)
+        if self._reported or len(status) < self.num_workers or not all(w.get("ready") for w in status):
+            return
+        self._reported = True
+
+        print("\n📊 Memory (MB) — parent after model load vs forked workers")
+        print(f"{'process':<12} {'rss':>8} {'pss':>8} {'shared':>8} {'private':>8}")
+        rows = [("parent", parent_memory)] + [(f"worker {w['index']}", w["memory"]) for w in status]
+        for name, mem in rows:
+            shared = mem.get("shared_clean_mb", 0) + mem.get("shared_dirty_mb", 0)
+            private = mem.get("private_clean_mb", 0) + mem.get("private_dirty_mb", 0)
+            print(f"{name:<12} {mem.get('rss_mb', 0):>8.1f} {mem.get('pss_mb', 0):>8.1f} {shared:>8.1f} {private:>8.1f}")
+        print()
+
+    def stop(self, sig=signal.SIGTERM):
+        for pid in list(self.workers):
+            self._retiring.add(pid)
+            self._signal(pid, sig)
+
+        deadline = time.time() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.time() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+        self._reap()
+
+    def run(self, parent_memory: dict):
+        self._install_signals()
+        self._fill()
+
+        while True:
+            while self._signals:
+                sig = self._signals.pop(0)
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    print("🛑 Shutting down workers (graceful)")
+                    self.stop()
+                    return 0
+                if sig == signal.SIGHUP:
+                    self.rolling_restart()
+                elif sig == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif sig == signal.SIGTTOU and self.num_workers > 1:
+                    self.num_workers -= 1
+
+            self._reap()
+            if self.crash_loop:
+                self.stop()
+                return 1
+            self._kill_stale()
+            self._fill()
+            self.report_memory(parent_memory)
+            time.sleep(0.5)
+
+
+# -------------------------------------------------------------
+# Entry point
+# -------------------------------------------------------------
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="PromptGuard pre-fork server")
+    ap.add_argument("--workers", type=int, default=default_workers())
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", 9000)))
+    args = ap.parse_args(argv)
+
+    worker_dir = tempfile.mkdtemp(prefix="promptguard-workers-")
+    os.environ[WORKER_DIR_ENV] = worker_dir
+
+    # 1 — everything shared gets loaded here, before any fork
+    from backend import api
+    from backend.detectors import engines
+
+    if not hasattr(os, "fork"):
+        print("⚠ os.fork unavailable — running a single uvicorn process")
+        import uvicorn
+        uvicorn.run(api.app, host=args.host, port=args.port)
+        return 0
+
+    # Forward pass is left to the workers (forking after a threaded
+    # OpenMP region in the parent is not safe)
+    engines.warm_up(forward=False)
+    status = engines.status()
+    if status["error"]:
+        print("❌ Engine load failed:", status["error"])
+        return 1
+
+    # 2 — freeze: later GC passes in the workers won't touch shared objects
+    gc.collect()
+    gc.freeze()
+    parent_memory = memory_snapshot()
+    print(f"🧊 Engines loaded in parent ({status['engine']}) — {parent_memory.get('rss_mb', '?')} MB RSS")
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🚀 PromptGuard listening on {args.host}:{args.port} with {args.workers} workers")
+
+    torch_threads = int(os.getenv("PROMPTGUARD_TORCH_THREADS", 0)) or max(1, available_cpus() // max(1, args.workers))
+    arbiter = Arbiter(api.app, sock, args.workers, worker_dir, torch_threads)
+    try:
+        return arbiter.run(parent_memory)
+    finally:
+        sock.close()
+        shutil.rmtree(worker_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
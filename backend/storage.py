@@ -0,0 +1,348 @@
+# backend/storage.py
+
+"""
+Event Storage (SQLite, WAL)
+---------------------------
+✓ One row per analyzed prompt: time, verdict, category, score, severity,
+  prompt hash, reasons, rule pack, source (+ conversation id, client id).
+  The prompt and sanitized text themselves only with STORAGE_STORE_PROMPTS=1
+✓ record() only enqueues — a background thread inserts in batches, one
+  transaction per batch (flush every N events or T seconds)
+✓ WAL mode → the API reads history while the writer inserts; pre-fork
+  workers share one database file (busy timeout instead of errors)
+✓ Indexes on time, verdict + time and category + time → /history pages
+  and /stats windows never scan the whole table
+✓ Keyset pagination (cursor = last (ts, id)) → page 1000 costs the same as page 1
+✓ history(client_id=...) → one client's own decisions (index on client + time)
+✓ Optional retention (STORAGE_RETENTION_DAYS)
+
+The text log (detectors/logger.py) stays the append-only audit trail;
+this is the queryable copy.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+STORAGE_ENABLED = os.getenv("PROMPTGUARD_STORAGE", "1") != "0"
+# Default: next to the audit log (PROMPTGUARD_LOG_FILE) → one variable moves both
+STORAGE_DB = os.getenv("PROMPTGUARD_DB") or os.path.join(
+    os.path.dirname(os.getenv("PROMPTGUARD_LOG_FILE", "promptguard.log")), "promptguard.db"
+)
+# Raw user text is opt-in; by default only its SHA-256 is kept (repeats
+# and known prompts can still be looked up)
+STORE_PROMPTS = os.getenv("STORAGE_STORE_PROMPTS", "0") == "1"
+
+STORAGE_QUEUE_SIZE = int(os.getenv("STORAGE_QUEUE_SIZE", 10000))
+STORAGE_BATCH_SIZE = int(os.getenv("STORAGE_BATCH_SIZE", 500))
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", 0.5))
+STORAGE_BUSY_TIMEOUT = float(os.getenv("STORAGE_BUSY_TIMEOUT", 5.0))
+STORAGE_RETENTION_DAYS = float(os.getenv("STORAGE_RETENTION_DAYS", 0))
+
+MAX_PAGE_SIZE = 500
+PRUNE_EVERY_SECONDS = 3600
+
+BUCKETS = {"minute": 60, "hour": 3600, "day": 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id              INTEGER PRIMARY KEY,
+    ts              REAL    NOT NULL,
+    final_safe      INTEGER NOT NULL,
+    category        TEXT,
+    semantic_score  REAL,
+    severity        TEXT,
+    prompt_hash     TEXT,
+    prompt          TEXT,
+    sanitized       TEXT,
+    reason          TEXT,
+    rule_pack       TEXT,
+    source          TEXT,
+    conversation_id TEXT,
+    client_id       TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts          ON events (ts);
+CREATE INDEX IF NOT EXISTS events_verdict_ts  ON events (final_safe, ts);
+CREATE INDEX IF NOT EXISTS events_category_ts ON events (category, ts);
+"""
+
+_COLUMNS = (
+    "ts", "final_safe", "category", "semantic_score", "severity", "prompt_hash",
+    "prompt", "sanitized", "reason", "rule_pack", "source", "conversation_id", "client_id",
+)
+# Columns added after the first release → ALTER TABLE on older databases
+_ADDED_COLUMNS = ("prompt_hash", "client_id")
+_INSERT = f"INSERT INTO events ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+_SELECT = f"SELECT id, {', '.join(_COLUMNS)} FROM events"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=STORAGE_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: durable across app crashes, fsync only at checkpoints
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+    with conn:
+        for column in _ADDED_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE events ADD COLUMN {column} TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS events_client_ts ON events (client_id, ts)")
+    return conn
+
+
+def prompt_hash(prompt: str):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest() if prompt is not None else None
+
+
+class EventStore:
+    """Background batched writer + read queries over one SQLite file."""
+
+    def __init__(self, path, queue_size=STORAGE_QUEUE_SIZE, batch_size=STORAGE_BATCH_SIZE,
+                 flush_interval=STORAGE_FLUSH_INTERVAL, retention_days=STORAGE_RETENTION_DAYS,
+                 store_prompts=STORE_PROMPTS):
+        self.path = path
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.store_prompts = store_prompts
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._readers = threading.local()
+        self._last_prune = 0.0
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    # ----------------------------------------------------
+    # Writer lifecycle (lazy, and restarted after fork)
+    # ----------------------------------------------------
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name="promptguard-storage", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _run(self):
+        q = self._queue
+        conn = None
+        while True:
+            batch = []
+            flush_waiters = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    flush_waiters.append(item)
+                    break
+                batch.append(item)
+
+            if batch:
+                try:
+                    conn = conn or connect(self.path)
+                    self._write(conn, batch)
+                except sqlite3.Error as e:
+                    self.failed += len(batch)
+                    print("⚠ Storage write failed:", e)
+            for ev in flush_waiters:
+                ev.set()
+
+    def _write(self, conn, rows):
+        with conn:
+            conn.executemany(_INSERT, rows)
+        self.written += len(rows)
+        self.batches += 1
+
+        if self.retention_days > 0 and time.time() - self._last_prune >= PRUNE_EVERY_SECONDS:
+            self._last_prune = time.time()
+            with conn:
+                conn.execute("DELETE FROM events WHERE ts < ?", (time.time() - self.retention_days * 86400,))
+
+    # ----------------------------------------------------
+    # Writes
+    # ----------------------------------------------------
+    def _row(self, event: dict, ts: float) -> tuple:
+        keep = self.store_prompts
+        return (
+            ts,
+            int(bool(event.get("final_safe"))),
+            event.get("category"),
+            event.get("semantic_score"),
+            event.get("severity"),
+            prompt_hash(event.get("prompt")),
+            event.get("prompt") if keep else None,
+            event.get("sanitized") if keep else None,
+            json.dumps(event.get("reason") or [], ensure_ascii=False),
+            event.get("rule_pack"),
+            event.get("source"),
+            event.get("conversation_id"),
+            event.get("client_id"),
+        )
+
+    def record(self, event: dict):
+        """Enqueue one analysis event; dropped (and counted) when the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(self._row(event, time.time()))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far is committed."""
+        if self._pid != os.getpid():
+            return True
+        ev = threading.Event()
+        self._queue.put(ev)
+        return ev.wait(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    # ----------------------------------------------------
+    # Reads (one connection per thread, per process)
+    # ----------------------------------------------------
+    def _reader(self) -> sqlite3.Connection:
+        local = self._readers
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = connect(self.path)
+            local.pid = os.getpid()
+        return local.conn
+
+    def history(self, limit: int = 50, cursor: str = None, verdict: str = None,
+                category: str = None, since: float = None, until: float = None, client_id: str = None) -> dict:
+        """
+        Newest first. cursor = next_cursor of the previous page.
+        verdict: "blocked" | "safe". client_id: only that client's events.
+        Raises ValueError on bad arguments.
+        """
+        where, params = _window(since, until)
+        if client_id is not None:
+            where.append("client_id = ?")
+            params.append(client_id)
+        if verdict is not None:
+            if verdict not in ("blocked", "safe"):
+                raise ValueError("verdict must be 'blocked' or 'safe'")
+            where.append("final_safe = ?")
+            params.append(int(verdict == "safe"))
+        if category:
+            where.append("category = ?")
+            params.append(category.upper())
+        if cursor:
+            where.append("(ts, id) < (?, ?)")
+            params.extend(_parse_cursor(cursor))
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        sql = _SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts DESC, id DESC LIMIT ?"
+        rows = self._reader().execute(sql, (*params, limit + 1)).fetchall()
+
+        items = [_item(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last[1]!r}:{last[0]}"
+        return {"items": items, "count": len(items), "next_cursor": next_cursor}
+
+    def summary(self, since: float = None, until: float = None, bucket: str = "hour") -> dict:
+        """Totals, blocks per category and a timeline. Default window: the last 24 h."""
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {sorted(BUCKETS)}")
+        if since is None and until is None:
+            since = time.time() - 86400
+        where, params = _window(since, until)
+        clause = " WHERE " + " AND ".join(where) if where else ""
+        conn = self._reader()
+
+        total, blocked, avg_score, first, last = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(final_safe = 0), 0), AVG(semantic_score), MIN(ts), MAX(ts) FROM events" + clause,
+            params,
+        ).fetchone()
+
+        categories = conn.execute(
+            "SELECT COALESCE(category, 'UNKNOWN'), COUNT(*) FROM events WHERE "
+            + " AND ".join(where + ["final_safe = 0"]) + " GROUP BY category ORDER BY COUNT(*) DESC",
+            params,
+        ).fetchall()
+
+        width = BUCKETS[bucket]
+        timeline = conn.execute(
+            "SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, COUNT(*), SUM(final_safe = 0) FROM events"
+            + clause + " GROUP BY bucket ORDER BY bucket",
+            (width, width, *params),
+        ).fetchall()
+
+        return {
+            "since": since,
+            "until": until,
+            "total": total,
+            "blocked": blocked,
+            "safe": total - blocked,
+            "block_rate": round(blocked / total, 4) if total else 0.0,
+            "avg_semantic_score": round(avg_score, 4) if avg_score is not None else None,
+            "first_ts": first,
+            "last_ts": last,
+            "by_category": [{"category": c, "blocked": n} for c, n in categories],
+            "bucket": bucket,
+            "timeline": [{"ts": b, "total": n, "blocked": k} for b, n, k in timeline],
+        }
+
+
+def _window(since, until):
+    where, params = [], []
+    if since is not None:
+        where.append("ts >= ?")
+        params.append(float(since))
+    if until is not None:
+        where.append("ts < ?")
+        params.append(float(until))
+    return where, params
+
+
+def _parse_cursor(cursor: str):
+    ts, _, rid = cursor.rpartition(":")
+    try:
+        return float(ts), int(rid)
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}") from None
+
+
+def _item(row) -> dict:
+    record = dict(zip(("id",) + _COLUMNS, row))
+    record["safe"] = bool(record.pop("final_safe"))
+    record["reason"] = json.loads(record["reason"] or "[]")
+    return record
+
+
+STORE = EventStore(STORAGE_DB)
+atexit.register(STORE.flush)
+
+
+def record_event(event: dict):
+    if STORAGE_ENABLED:
+        STORE.record(event)
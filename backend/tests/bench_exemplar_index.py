@@ -0,0 +1,108 @@
+"""
+Exemplar index benchmark — IVF recall vs exact
+----------------------------------------------
+Synthetic, clustered, L2-normalized "embeddings" (attack corpora are
+full of near-duplicate paraphrases, so vectors cluster). Queries are
+noisy copies of corpus rows plus unrelated vectors.
+
+    python backend/tests/bench_exemplar_index.py --rows 100000 --dim 768
+    python backend/tests/bench_exemplar_index.py --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend.detectors.exemplar_index import ExactIndex, IVFIndex
+
+
+def normalize(x):
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_corpus(rng, rows, dim, clusters):
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=rows)
+    return normalize(centers[labels] + 0.6 * rng.normal(size=(rows, dim)))
+
+
+def make_queries(rng, corpus, n):
+    near = corpus[rng.integers(0, len(corpus), size=n // 2)]
+    near = normalize(near + 0.05 * rng.normal(size=near.shape))
+    far = normalize(rng.normal(size=(n - len(near), corpus.shape[1])))
+    return np.vstack([near, far])
+
+
+def per_query_ms(fn, queries):
+    # One query per call — matches the per-request hot path
+    start = time.perf_counter()
+    out = [fn(queries[i:i + 1]) for i in range(len(queries))]
+    elapsed = time.perf_counter() - start
+    scores = np.concatenate([s for s, _ in out])
+    rows = np.concatenate([r for _, r in out])
+    return elapsed / len(queries) * 1000, scores, rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--clusters", type=int, default=500)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--lists", type=int, default=0)
+    ap.add_argument("--probes", default="1,2,4,8,16,32")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = make_corpus(rng, args.rows, args.dim, args.clusters)
+    queries = make_queries(rng, corpus, args.queries)
+
+    exact = ExactIndex(corpus)
+    exact_ms, exact_scores, exact_rows = per_query_ms(exact.search, queries)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(corpus, n_lists=args.lists)
+    build_s = time.perf_counter() - start
+
+    report = {
+        "rows": args.rows,
+        "dim": args.dim,
+        "queries": args.queries,
+        "exact_ms_per_query": round(exact_ms, 4),
+        "ivf": {**ivf.describe(), "build_seconds": round(build_s, 3)},
+        "runs": [],
+    }
+
+    for n_probe in [int(p) for p in args.probes.split(",")]:
+        ms, scores, rows = per_query_ms(lambda q: ivf.search(q, n_probe=n_probe), queries)
+        report["runs"].append({
+            "n_probe": n_probe,
+            "ms_per_query": round(ms, 4),
+            "speedup": round(exact_ms / ms, 2),
+            "recall_at_1": round(float(np.mean(rows == exact_rows)), 4),
+            "max_score_error": round(float(np.max(exact_scores - scores)), 5),
+        })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n🔎 {args.rows} rows × {args.dim} dims | {args.queries} queries")
+    print(f"   exact: {exact_ms:.3f} ms/query")
+    print(f"   ivf:   {report['ivf']}\n")
+    print(f"{'n_probe':>8} {'ms/query':>10} {'speedup':>8} {'recall@1':>9} {'max Δscore':>11}")
+    for r in report["runs"]:
+        print(f"{r['n_probe']:>8} {r['ms_per_query']:>10.3f} {r['speedup']:>7.1f}x "
+              f"{r['recall_at_1']:>9.3f} {r['max_score_error']:>11.5f}")
+
+
+if __name__ == "__main__":
+    main()
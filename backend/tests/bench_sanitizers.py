@@ -0,0 +1,115 @@
+"""
+Sanitizer micro-benchmark
+-------------------------
+Compares the compiled one-pass sanitizers (sanitizer_compiler.py) against
+the old rule-by-rule loops: equivalence on random prompts, then latency.
+The compiled column goes through sanitize_prompt(), so it includes the
+normalization pre-pass and, on a hit, the offset map back to the original.
+
+    python backend/tests/bench_sanitizers.py
+"""
+
+import os
+import sys
+import random
+import re
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend.detectors import sanitizer_heavy, sanitizer_light
+
+
+# -------------------------------------------------------
+# Reference: the original loops
+# -------------------------------------------------------
+def legacy_light(prompt: str) -> str:
+    cleaned = prompt
+    for word in sanitizer_light.DANGEROUS_KEYWORDS:
+        cleaned = re.sub(word, "[REMOVED]", cleaned, flags=re.IGNORECASE)
+    return cleaned
+
+
+def legacy_heavy(prompt: str) -> str:
+    text = prompt
+    for pattern, safe_version in sanitizer_heavy.REWRITE_RULES:
+        if re.search(pattern, text, flags=re.IGNORECASE):
+            return safe_version
+    for pattern, repl in sanitizer_heavy.GENERIC_REPLACEMENTS:
+        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
+    return " ".join(text.split())
+
+
+FILLER = (
+    "the quick brown fox jumps over the lazy dog while people talk about "
+    "cooking pasta gardening weekend plans travel music and football"
+).split()
+
+# Overlaps and priority traps: "self harm"/"harm", "filter bypass"/"bypass",
+# "stealeak" (steal + leak share an 'l'), "how to hack into" (later rewrite
+# rule matches first), casing and odd whitespace.
+TRICKY = [
+    "Self Harm", "self harm", "harm", "filter bypass", "FILTER BYPASS", "stealeak",
+    "how to hack into", "How To Make A Bomb", "make a bomb", "kill", "KILL",
+    "hack", "drugs", "weapon", "toxic drugs", "system prompt", "developer prompt",
+    "disable safety", "password", "passwordleak", "killhack", "kill-hack",
+    "\t", "  ", "\n", "Ünïcode", "İstanbul", "bomb,", "(hack)",
+]
+
+
+def make_prompt(words: int, traps: int) -> str:
+    body = [random.choice(FILLER) for _ in range(words)]
+    for _ in range(traps):
+        body.insert(random.randrange(len(body) + 1), random.choice(TRICKY))
+    sep = random.choice([" ", "  ", " \t", "\n"])
+    return random.choice(["", " ", "\n"]) + sep.join(body) + random.choice(["", " ", "\t"])
+
+
+def timeit(fn, prompts, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for p in prompts:
+            fn(p)
+        best = min(best, time.perf_counter() - start)
+    return best / len(prompts) * 1000
+
+
+def main():
+    random.seed(7)
+
+    pairs = [
+        ("sanitizer_light", legacy_light, sanitizer_light.sanitize_prompt),
+        ("sanitizer_heavy", legacy_heavy, sanitizer_heavy.sanitize_prompt),
+    ]
+
+    # 1 — equivalence
+    corpus = [make_prompt(random.randint(0, 200), random.randint(0, 6)) for _ in range(5000)]
+    corpus += TRICKY + [" ".join(TRICKY), ""]
+
+    failed = False
+    for name, old, new in pairs:
+        mismatches = [p for p in corpus if old(p) != new(p)]
+        failed |= bool(mismatches)
+        print(f"{name}: {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+        for p in mismatches[:5]:
+            print("  MISMATCH:", repr(p[:120]))
+
+    # 2 — latency by prompt length (clean = no rewrite short-circuit)
+    print(f"\n{'engine':<16} {'words':>6} {'legacy ms':>11} {'compiled ms':>12} {'speedup':>8}")
+    for name, old, new in pairs:
+        for words, traps in ((10, 0), (100, 2), (1000, 10), (5000, 0)):
+            prompts = [make_prompt(words, traps) for _ in range(20)]
+            if name == "sanitizer_heavy":
+                # Rewrite hits return a constant; measure the generic path
+                prompts = [p for p in prompts if sanitizer_heavy.REWRITES.first(p) is None] or prompts
+            t_old = timeit(old, prompts)
+            t_new = timeit(new, prompts)
+            print(f"{name:<16} {words:>6} {t_old:>11.4f} {t_new:>12.4f} {t_old / t_new:>7.1f}x")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Local Gemini stub server
+------------------------
+Speaks just enough of the Gemini REST API to test PromptGuard offline:
+
+  POST .../models/<m>:generateContent        → one JSON body
+  POST .../models/<m>:streamGenerateContent  → chunked SSE, one event per word,
+                                               STUB_CHUNK_DELAY seconds apart
+
+    python backend/tests/gemini_stub.py 9100
+    GEMINI_BASE_URL=http://127.0.0.1:9100/v1beta GEMINI_API_KEY=stub python -m backend.api
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = "This is a streamed reply from the local Gemini stub server."
+STUB_CHUNK_DELAY = 0.2
+
+
+def _candidate(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            for word in STUB_REPLY.split(" "):
+                event = "data: " + json.dumps(_candidate(word + " ")) + "\r\n\r\n"
+                self._chunk(event.encode("utf-8"))
+                time.sleep(STUB_CHUNK_DELAY)
+            self._chunk(b"")
+            return
+
+        if ":generateContent" in self.path:
+            body = json.dumps(_candidate(STUB_REPLY)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def start_stub(port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stub on a daemon thread; port 0 picks a free one."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), GeminiStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9100
+    print(f"🧪 Gemini stub listening on http://127.0.0.1:{port}/v1beta")
+    ThreadingHTTPServer(("127.0.0.1", port), GeminiStubHandler).serve_forever()
@@ -3,6 +3,18 @@ import "./App.css";
 import ResultPanel from "./components/ResultPanel";
 import HistoryPanel from "./components/HistoryPanel";
 
+// Random per-browser id: /history only returns this client's decisions
+function clientId() {
+  let id = localStorage.getItem("promptguard-client");
+  if (!id) {
+    id = crypto.randomUUID();
+    localStorage.setItem("promptguard-client", id);
+  }
+  return id;
+}
+
+const CLIENT_HEADERS = { "X-Client-Id": clientId() };
+
 function App() {
   const [prompt, setPrompt] = useState("");
   const [result, setResult] = useState(null);
@@ -37,6 +49,41 @@ function App() {
     return () => clearInterval(timer);
   }, []);
 
+  // Stored History (backend /history) — keeps the local list if unavailable
+  async function loadHistory() {
+    try {
+      const res = await fetch(`${API}/history?limit=50`, { headers: CLIENT_HEADERS });
+      if (!res.ok) return;
+
+      const data = await res.json();
+      setHistory(
+        data.items.map((item) => ({
+          // Prompt text is only stored with STORAGE_STORE_PROMPTS=1
+          prompt: item.prompt ?? `🔒 ${item.prompt_hash?.slice(0, 12) ?? "not stored"}`,
+          safe: item.safe,
+          full: {
+            safe: item.safe,
+            analysis: {
+              final_safe: item.safe,
+              reason: item.reason,
+              sanitized: item.sanitized,
+              semantic_score: item.semantic_score ?? 0,
+              severity: item.severity,
+              category: item.category,
+              rule_pack: item.rule_pack,
+            },
+          },
+        }))
+      );
+    } catch {
+      // Backend offline → history stays local
+    }
+  }
+
+  useEffect(() => {
+    loadHistory();
+  }, []);
+
   // Analyze Prompt
   async function analyzePrompt() {
     setLoading(true);
@@ -45,7 +92,7 @@ function App() {
     try {
       const res = await fetch(`${API}/analyze`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", ...CLIENT_HEADERS },
         body: JSON.stringify({ prompt }),
       });
 